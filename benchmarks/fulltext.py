@@ -0,0 +1,78 @@
+'''
+Per-URL latency of the Playwright fulltext fallback, launching a fresh
+Chromium for every URL (the old behaviour) versus the shared BrowserPool.
+
+    python benchmarks/fulltext.py URL [URL ...] [--pool-size 2] [--repeat 1]
+'''
+import argparse
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "microfilm"))
+
+from browser import BrowserPool  # noqa: E402
+from playwright.sync_api import sync_playwright  # noqa: E402
+
+
+def cold(urls, wait_strategy, timeout):
+    timings = []
+    for url in urls:
+        start = time.perf_counter()
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=True)
+            try:
+                page = browser.new_page()
+                page.set_default_timeout(timeout)
+                page.goto(url, timeout=timeout)
+                try:
+                    page.wait_for_load_state(wait_strategy, timeout=timeout)
+                except Exception:
+                    pass
+                page.content()
+            finally:
+                browser.close()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def pooled(urls, wait_strategy, timeout, size):
+    def render(url):
+        start = time.perf_counter()
+        pool.render(url, wait_strategy, timeout)
+        return time.perf_counter() - start
+
+    with BrowserPool(size) as pool:
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            return list(executor.map(render, urls))
+
+
+def report(name, timings, elapsed):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<8} n={len(timings):<4} mean={statistics.mean(timings):.3f}s "
+          f"median={statistics.median(timings):.3f}s p95={p95:.3f}s wall={elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--wait", default="networkidle", choices=["networkidle", "domcontentloaded"])
+    parser.add_argument("--timeout", type=int, default=10000, help="milliseconds")
+    args = parser.parse_args()
+
+    urls = args.urls * args.repeat
+
+    start = time.perf_counter()
+    report("cold", cold(urls, args.wait, args.timeout), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    report("pooled", pooled(urls, args.wait, args.timeout, args.pool_size), time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
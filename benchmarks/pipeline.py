@@ -0,0 +1,375 @@
+'''
+Offline benchmark of the whole pipeline against a local fixture server.
+
+Serves a generated RSS feed and article pages from 127.0.0.1, mixing normal,
+slow, JS-only (forcing the Playwright fallback) and broken pages, then times
+each stage: gather, download, parse, fulltext, render and write. Reports
+throughput, latency percentiles and peak memory per stage (max RSS always,
+peak Python allocations with --tracemalloc).
+
+    python benchmarks/pipeline.py --articles 1000 --output bench.json
+    python benchmarks/pipeline.py --articles 100 --fixtures recorded/ --no-browser
+
+With --fixtures, recorded *.html pages are served (cycled) in place of the
+generated normal and slow pages. The feed is always generated so every
+scenario size stays reproducible.
+'''
+import argparse
+import json
+import logging
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.request import urlopen
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "microfilm"))
+
+WORDS = (
+    "council budget transit housing school district vote mayor residents "
+    "report officials county state funding plan public hearing water "
+    "project community police court election campaign spokesperson said"
+).split()
+
+
+class Scenario():
+    def __init__(self, articles, feed_size, slow_ratio, js_ratio, broken_ratio, slow_delay, seed, fixtures=None):
+        self.articles = articles
+        self.feed_size = min(feed_size, articles)
+        self.slow_delay = slow_delay
+        self.recorded = sorted(Path(fixtures).glob("*.html")) if fixtures else []
+        rng = random.Random(seed)
+        self.kinds = []
+        for _ in range(articles):
+            roll = rng.random()
+            if roll < broken_ratio:
+                self.kinds.append("broken")
+            elif roll < broken_ratio + js_ratio:
+                self.kinds.append("js")
+            elif roll < broken_ratio + js_ratio + slow_ratio:
+                self.kinds.append("slow")
+            else:
+                self.kinds.append("normal")
+
+    def urls(self, base, kind=None):
+        return [f"{base}/article/{i}" for i, k in enumerate(self.kinds) if kind is None or k == kind]
+
+    def feed(self, base) -> bytes:
+        items = []
+        for i in range(self.feed_size):
+            items.append(
+                f"<item><title>Article {i}</title><link>{base}/article/{i}</link>"
+                f"<guid>{base}/article/{i}</guid><author>Jane Doe</author>"
+                f"<pubDate>{formatdate(1700000000 + i * 60)}</pubDate>"
+                f"<description>Summary of article {i}</description></item>"
+            )
+        return (
+            '<?xml version="1.0"?><rss version="2.0"><channel><title>Benchmark feed</title>'
+            f'<link>{base}/</link><description>Fixture feed</description>{"".join(items)}</channel></rss>'
+        ).encode("utf-8")
+
+    def article(self, i) -> tuple[int, bytes]:
+        kind = self.kinds[i]
+        if kind == "broken":
+            if i % 2:
+                return 500, b"Internal Server Error"
+            return 200, b"<html><head><title>Broken</title></head><body><div><p>Trunc"
+        if kind == "slow":
+            time.sleep(self.slow_delay)
+        if self.recorded and kind != "js":
+            return 200, self.recorded[i % len(self.recorded)].read_bytes()
+
+        rng = random.Random(i)
+        paragraphs = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 90))).capitalize() + "."
+            for _ in range(rng.randint(6, 14))
+        ]
+        title = f"Benchmark article {i}: " + " ".join(rng.choice(WORDS) for _ in range(6))
+        head = (
+            f"<head><title>{title}</title><meta name='author' content='Jane Doe'>"
+            f"<meta property='article:published_time' content='2024-01-{i % 28 + 1:02d}T12:00:00Z'></head>"
+        )
+        if kind == "js":
+            body = json.dumps("".join(f"<p>{p}</p>" for p in paragraphs))
+            html = (
+                f"<html>{head}<body><h1>{title}</h1><div id='app'></div>"
+                f"<script>document.getElementById('app').innerHTML = {body};</script></body></html>"
+            )
+        else:
+            html = (
+                f"<html>{head}<body><article><h1>{title}</h1><p class='byline'>By Jane Doe</p>"
+                + "".join(f"<p>{p}</p>" for p in paragraphs)
+                + "</article></body></html>"
+            )
+        return 200, html.encode("utf-8")
+
+
+def serve(scenario):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            base = f"http://{self.headers['Host']}"
+            path = self.path.split("?", 1)[0]
+            if path == "/feed.xml":
+                self._send(200, scenario.feed(base), "application/rss+xml")
+            elif path.startswith("/article/"):
+                try:
+                    i = int(path.rsplit("/", 1)[-1])
+                    status, body = scenario.article(i)
+                except (ValueError, IndexError):
+                    status, body = 404, b"Not found"
+                self._send(status, body, "text/html; charset=utf-8")
+            else:
+                self._send(404, b"Not found", "text/plain")
+
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+class NoBrowser():
+    """Stands in for BrowserPool with --no-browser so fallbacks fail fast."""
+
+    def render(self, *args, **kwargs):
+        raise RuntimeError("browser disabled for this benchmark run")
+
+    def close(self):
+        pass
+
+
+class Stage():
+    def __init__(self, name):
+        self.name = name
+        self.timings = []
+        self.items = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self.peak = 0
+        self.rss = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        if tracemalloc.is_tracing():
+            self.peak = tracemalloc.get_traced_memory()[1]
+        self.rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            result = None
+        with self._lock:
+            self.timings.append(time.perf_counter() - start)
+            self.items += 1
+            if not result:
+                self.failed += 1
+        return result
+
+    def summary(self):
+        timings = sorted(self.timings)
+
+        def pct(p):
+            return timings[min(len(timings) - 1, int(len(timings) * p))] * 1000 if timings else 0.0
+
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "failed": self.failed,
+            "elapsed_s": round(self.elapsed, 4),
+            "throughput_per_s": round(self.items / self.elapsed, 2) if self.elapsed else 0.0,
+            "p50_ms": round(pct(0.50), 2),
+            "p95_ms": round(pct(0.95), 2),
+            "p99_ms": round(pct(0.99), 2),
+            "mean_ms": round(statistics.mean(timings) * 1000, 2) if timings else 0.0,
+            "peak_python_mb": round(self.peak / 2**20, 2),
+            "max_rss_mb": round(self.rss / 1024, 2),
+        }
+
+
+def configure(output_directory, threads):
+    '''Point microfilm at a throwaway config before its modules are imported.'''
+    import config
+    config_file = Path(output_directory).parent / "config.yaml"
+    config_file.write_text(
+        f"rss: []\noutput_directory: {output_directory}\n"
+        f"template_directory: {PROJECT_ROOT / 'templates'}\n"
+        f"thread_count: {threads}\nper_host_limit: {threads}\n"
+        f"download_retries: 0\ntimeout: 5000\n"
+        # Pages link the CDN assets directly, so rendering never reaches the network
+        f"vendor_assets: false\n"
+    )
+    config.config_path = config_file
+    config.load_config.cache_clear()
+    return config.load_config()
+
+
+def run(args):
+    workdir = Path(tempfile.mkdtemp(prefix="microfilm-bench-"))
+    output = workdir / "site"
+    configure(output, args.threads)
+
+    import microfilm
+    from archive import ArchiveIndex
+    from browser import BrowserPool
+
+    scenario = Scenario(args.articles, args.feed_size, args.slow_ratio, args.js_ratio,
+                        args.broken_ratio, args.slow_delay, args.seed, args.fixtures)
+    server, base = serve(scenario)
+    index = ArchiveIndex(output)
+    stages = []
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    with Stage("gather") as stage:
+        for i in range(args.repeat):
+            # A fresh feed key each round so conditional GET never short-circuits
+            stage.timed(microfilm.Newsgather(f"{base}/feed.xml?round={i}", index).gather)
+    stages.append(stage)
+
+    class TimedBatchDownloader(microfilm.BatchDownloader):
+        def _download(self, url, parser=None):
+            return download_stage.timed(super()._download, url, parser)
+
+    articles = []
+    with Stage("download") as download_stage:
+        browser = NoBrowser() if args.no_browser else BrowserPool(args.browsers)
+        try:
+            downloader = TimedBatchDownloader(browser, threads=args.threads, retries=0, processes=args.parse_processes)
+            if args.no_browser:
+                downloader_urls = [u for u, k in zip(scenario.urls(base), scenario.kinds) if k != "js"]
+            else:
+                downloader_urls = scenario.urls(base)
+            for url, data in downloader.download(downloader_urls, total=len(downloader_urls)):
+                if data:
+                    articles.append(data)
+        finally:
+            browser.close()
+    stages.append(download_stage)
+
+    sample = scenario.urls(base, "normal")[: args.sample]
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        pages = list(pool.map(lambda u: (u, urlopen(u).read().decode("utf-8", "replace")), sample))
+    with Stage("parse") as stage:
+        for url, html in pages:
+            stage.timed(microfilm.ArticleDownloader(url)._create_article, url, html)
+    stages.append(stage)
+
+    if not args.no_browser:
+        js_urls = scenario.urls(base, "js")[: args.sample]
+        with Stage("fulltext") as stage:
+            with BrowserPool(args.browsers) as browser:
+                with ThreadPoolExecutor(max_workers=args.browsers) as pool:
+                    list(pool.map(lambda u: stage.timed(microfilm.ArticleDownloader(u, browser)._fulltext, u), js_urls))
+        stages.append(stage)
+
+    typeset = microfilm.Typeset(index)
+    rendered = []
+    with Stage("render") as stage:
+        for data in articles:
+            html = stage.timed(typeset.render_html, data)
+            rendered.append((html, data))
+    stages.append(stage)
+
+    with Stage("write") as stage:
+        for html, data in rendered:
+            if html:
+                stage.timed(typeset._create_files, {"html": html, "json": typeset.render_json(data)}, data)
+    stages.append(stage)
+
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    server.shutdown()
+
+    return {
+        "commit": _git_commit(),
+        "scenario": {
+            "articles": args.articles,
+            "feed_size": scenario.feed_size,
+            "kinds": {k: scenario.kinds.count(k) for k in ("normal", "slow", "js", "broken")},
+            "threads": args.threads,
+            "browsers": 0 if args.no_browser else args.browsers,
+            "parse_processes": args.parse_processes,
+        },
+        "stages": [s.summary() for s in stages],
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+        "output_directory": str(output),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def report(results):
+    print(f"commit {results['commit']}  {results['scenario']}")
+    print(f"{'stage':<10}{'items':>8}{'failed':>8}{'elapsed':>10}{'items/s':>10}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'py MB':>10}{'rss MB':>10}")
+    for s in results["stages"]:
+        print(f"{s['stage']:<10}{s['items']:>8}{s['failed']:>8}{s['elapsed_s']:>10.2f}"
+              f"{s['throughput_per_s']:>10.1f}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}"
+              f"{s['p99_ms']:>10.1f}{s['peak_python_mb']:>10.1f}{s['max_rss_mb']:>10.1f}")
+    print(f"peak RSS {results['peak_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100, help="articles served (100 to 100000)")
+    parser.add_argument("--feed-size", type=int, default=100, help="items in the RSS feed")
+    parser.add_argument("--slow-ratio", type=float, default=0.05)
+    parser.add_argument("--js-ratio", type=float, default=0.05)
+    parser.add_argument("--broken-ratio", type=float, default=0.02)
+    parser.add_argument("--slow-delay", type=float, default=0.5, help="seconds")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--browsers", type=int, default=2)
+    parser.add_argument("--parse-processes", type=int, default=0, help="extraction processes, 0 for one per CPU, 1 for in-thread")
+    parser.add_argument("--no-browser", action="store_true", help="skip JS-only pages and the fulltext stage")
+    parser.add_argument("--sample", type=int, default=200, help="pages used by the parse and fulltext stages")
+    parser.add_argument("--repeat", type=int, default=5, help="feed fetches in the gather stage")
+    parser.add_argument("--fixtures", help="directory of recorded article *.html pages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true", help="track peak Python memory per stage (slower)")
+    parser.add_argument("--log-level", default="ERROR")
+    parser.add_argument("--output", help="write results as JSON for comparing runs")
+    args = parser.parse_args()
+    logging.basicConfig(format='[%(levelname)s] %(message)s', level=args.log_level)
+
+    results = run(args)
+    report(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+'''
+Wall-clock startup time of the CLI for commands that should not touch the
+network or the browser. Commands run against a throwaway config and an
+empty site, never the user's config.yaml or archive, so "build" measures
+startup rather than an incremental build.
+
+    python benchmarks/startup.py [--repeat 5] [--command "--help" --command "build"]
+'''
+import argparse
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+MODULE_ROOT = PROJECT_ROOT / "microfilm"
+
+# Runs main.py as a script, with the config path swapped before microfilm loads it
+BOOTSTRAP = """
+import runpy, sys
+import config
+config.config_path = sys.argv.pop(1)
+sys.argv[0] = "main.py"
+runpy.run_path("main.py", run_name="__main__")
+"""
+
+
+def configure(directory):
+    '''Write a config with no feeds and an empty output directory.'''
+    config_file = Path(directory) / "config.yaml"
+    config_file.write_text(
+        f"rss: []\noutput_directory: {Path(directory) / 'site'}\n"
+        f"template_directory: {PROJECT_ROOT / 'templates'}\n"
+        f"metrics_directory: {Path(directory) / 'metrics'}\n"
+        f"page_cache_directory: {Path(directory) / 'pages'}\n"
+        f"vendor_assets: false\n"
+    )
+    return config_file
+
+
+def measure(args, repeat, config_file):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", BOOTSTRAP, str(config_file), *args],
+            cwd=MODULE_ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            print(result.stderr.decode(errors="replace"), file=sys.stderr)
+            raise SystemExit(f"'main.py {' '.join(args)}' exited with {result.returncode}")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--command", action="append", dest="commands")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_file = configure(directory)
+        for command in args.commands or ["--help", "build"]:
+            timings = measure(shlex.split(command), args.repeat, config_file)
+            print(f"{command:<12} median={statistics.median(timings) * 1000:.0f}ms "
+                  f"min={min(timings) * 1000:.0f}ms max={max(timings) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# Module imports
+import sqlite3
+import threading
+import logging
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+class ArchiveIndex():
+    """Persistent index of archived articles, keyed by URL."""
+
+    FILENAME = "index.sqlite"
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = Path.joinpath(self.directory, self.FILENAME)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS articles (
+                url TEXT PRIMARY KEY,
+                slug TEXT NOT NULL,
+                content_hash TEXT,
+                formats TEXT NOT NULL DEFAULT '',
+                archived_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS articles_slug ON articles (slug)")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS aliases (
+                url TEXT PRIMARY KEY,
+                canonical TEXT NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS feeds (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                modified TEXT,
+                entries TEXT NOT NULL DEFAULT '{}',
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS builds (
+                name TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                template_hash TEXT NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                source TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        self._db.commit()
+
+    def __contains__(self, url: str) -> bool:
+        return self.contains(url)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def contains(self, url: str) -> bool:
+        """Return True if the URL, or an article it was an alias of, has already been archived."""
+        if not url:
+            return False
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM articles WHERE url = ? UNION ALL SELECT 1 FROM aliases WHERE url = ? LIMIT 1",
+                (url, url)
+            ).fetchone()
+        return row is not None
+
+    def add_alias(self, url: str, canonical: str):
+        """Remember that fetching `url` gave the article archived as `canonical`."""
+        self.add_aliases([(url, canonical)])
+
+    def add_aliases(self, pairs):
+        """Store several (url, canonical) aliases in one transaction."""
+        pairs = [(url, canonical) for url, canonical in pairs if url and url != canonical]
+        if not pairs:
+            return
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO aliases (url, canonical) VALUES (?, ?)", pairs)
+            self._db.commit()
+
+    def slug_owner(self, slug: str) -> str | None:
+        """URL of the article already written under `slug`, if any."""
+        with self._lock:
+            row = self._db.execute("SELECT url FROM articles WHERE slug = ? LIMIT 1", (slug,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, url: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, slug, content_hash, formats, archived_at, updated_at FROM articles WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "url": row[0],
+            "slug": row[1],
+            "content_hash": row[2],
+            "formats": [f for f in row[3].split(",") if f],
+            "archived_at": row[4],
+            "updated_at": row[5],
+        }
+
+    def record(self, url: str, slug: str, format: str, content_hash: str = None):
+        """Insert or update an entry after a file has been written."""
+        self.record_many([(url, slug, format, content_hash)])
+
+    def record_many(self, rows):
+        """Record several (url, slug, format, content_hash) writes in one transaction."""
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            for url, slug, format, content_hash in rows:
+                if not url:
+                    logging.debug(f"Not indexing '{slug}': article has no URL")
+                    continue
+                row = self._db.execute("SELECT formats FROM articles WHERE url = ?", (url,)).fetchone()
+                formats = set(f for f in row[0].split(",") if f) if row else set()
+                formats.add(format)
+                self._db.execute(
+                    """
+                    INSERT INTO articles (url, slug, content_hash, formats, archived_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(url) DO UPDATE SET
+                        slug = excluded.slug,
+                        content_hash = COALESCE(excluded.content_hash, articles.content_hash),
+                        formats = excluded.formats,
+                        updated_at = excluded.updated_at
+                    """,
+                    (url, slug, content_hash, ",".join(sorted(formats)), now, now)
+                )
+            self._db.commit()
+
+    def rebuild(self, output_directory: Path, articles=None, store: str = None) -> int:
+        """Recreate the index from the JSON files in the output directory.
+
+        `articles` replaces the JSON files with (slug, data) pairs, such as
+        the records of a segment store, which are then also recorded under
+        the `store` format.
+        """
+        output_directory = Path(output_directory)
+        json_path = Path.joinpath(output_directory, "json")
+        count = 0
+
+        with self._lock:
+            self._db.execute("DELETE FROM articles")
+            self._db.commit()
+
+        if articles is None:
+            articles = json_articles(json_path)
+
+        for slug, data in articles:
+            url = data.get("url")
+            if not url:
+                logging.warning(f"Article has no URL, not indexing: {slug}")
+                continue
+
+            content_hash = content_digest(data)
+            for format_path in output_directory.iterdir():
+                if format_path.is_dir() and Path.joinpath(format_path, f"{slug}.{format_path.name}").exists():
+                    self.record(url, slug, format_path.name, content_hash)
+            if store:
+                self.record(url, slug, store, content_hash)
+            count += 1
+
+        logging.info(f"Rebuilt archive index with {count} articles")
+        return count
+
+    def load_feed(self, url: str) -> dict:
+        """Return the stored conditional-GET validators and entry hashes for a feed."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, modified, entries FROM feeds WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return {"etag": None, "modified": None, "entries": {}}
+        return {"etag": row[0], "modified": row[1], "entries": json.loads(row[2])}
+
+    def save_feed(self, url: str, etag: str = None, modified: str = None, entries: dict = None):
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT INTO feeds (url, etag, modified, entries, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    modified = excluded.modified,
+                    entries = excluded.entries,
+                    updated_at = excluded.updated_at
+                """,
+                (url, etag, modified, json.dumps(entries or {}), now)
+            )
+            self._db.commit()
+
+    def load_builds(self) -> dict:
+        """Return the build manifest as {json filename: (mtime_ns, size, content_hash, template_hash)}."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, mtime_ns, size, content_hash, template_hash FROM builds"
+            ).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def record_builds(self, rows):
+        """Store (name, mtime_ns, size, content_hash, template_hash) rows in the build manifest."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO builds (name, mtime_ns, size, content_hash, template_hash) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._db.commit()
+
+    def load_checkpoint(self, source: str) -> int:
+        """Number of input entries already processed for a bulk import source."""
+        with self._lock:
+            row = self._db.execute("SELECT position FROM checkpoints WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else 0
+
+    def save_checkpoint(self, source: str, position: int):
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints (source, position, updated_at) VALUES (?, ?, ?)",
+                (source, position, now)
+            )
+            self._db.commit()
+
+    def clear_checkpoint(self, source: str):
+        with self._lock:
+            self._db.execute("DELETE FROM checkpoints WHERE source = ?", (source,))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def json_articles(json_path: Path):
+    """Yield (slug, data) for every article JSON file in a directory."""
+    for json_file in Path(json_path).glob("*.json"):
+        try:
+            with open(json_file, "r", encoding="utf-8") as f:
+                yield json_file.stem, json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logging.warning(f"Could not read JSON file {json_file}: {e}")
+
+
+def content_digest(data: dict) -> str:
+    """Stable SHA-256 digest of an article's stored data."""
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
@@ -0,0 +1,85 @@
+# Module imports
+import logging
+import re
+
+# Prefix marking a filter entry as a regular expression
+REGEX_PREFIX = "re:"
+
+
+class AuthorMatcher():
+    """Byline filter compiled from the author_filter config.
+
+    The filter may be a single name, a list of names, or a mapping of names
+    to aliases. Names match case-insensitively anywhere in a byline with any
+    run of whitespace between words, and entries starting with "re:" are
+    regular expressions. Everything is compiled into one pattern, so a byline
+    is checked with a single search however many names are configured.
+    """
+
+    def __init__(self, spec=None):
+        self.spec = spec
+        self.pattern = self._compile(spec)
+
+    def __bool__(self) -> bool:
+        return self.pattern is not None
+
+    def __repr__(self) -> str:
+        return f"AuthorMatcher({self.spec!r})"
+
+    def match(self, author: str) -> bool:
+        return self.pattern is None or bool(self.pattern.search(author or ""))
+
+    def matches(self, authors) -> bool | None:
+        """True if any author matches, False if none do, None when there are no authors to check."""
+        if self.pattern is None:
+            return True
+        authors = [a for a in authors or [] if a and a.strip()]
+        if not authors:
+            return None
+        return any(self.pattern.search(author) for author in authors)
+
+    def _compile(self, spec):
+        if not spec:
+            return None
+        if isinstance(spec, str):
+            entries = [spec]
+        elif isinstance(spec, dict):
+            entries = []
+            for name, aliases in spec.items():
+                entries.append(name)
+                entries.extend([aliases] if isinstance(aliases, str) else aliases or [])
+        else:
+            entries = list(spec)
+
+        alternatives = []
+        for entry in entries:
+            entry = str(entry).strip()
+            if not entry:
+                continue
+            if entry.startswith(REGEX_PREFIX):
+                pattern = entry[len(REGEX_PREFIX):]
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    logging.error(f"Ignoring invalid author filter pattern '{pattern}': {e}")
+                    continue
+                alternatives.append(f"(?:{pattern})")
+            else:
+                alternatives.append(r"\s+".join(re.escape(word) for word in entry.split()))
+        if not alternatives:
+            return None
+        return re.compile("|".join(alternatives), re.IGNORECASE)
+
+
+def entry_authors(entry) -> list[str]:
+    """Bylines a feed entry declares through author, dc:creator or authors."""
+    names = []
+    for author in entry.get("authors") or []:
+        name = author.get("name") if isinstance(author, dict) else author
+        if name:
+            names.append(str(name))
+    for key in ("author", "dc_creator"):
+        value = entry.get(key)
+        if value and value not in names:
+            names.append(str(value))
+    return names
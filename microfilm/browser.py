@@ -0,0 +1,180 @@
+# Internal dependencies
+from lazy import lazy_import
+
+# External dependencies, imported on first use to keep CLI startup fast
+tldextract = lazy_import("tldextract")
+
+# Module imports
+import functools
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlparse
+
+PLAYWRIGHT_INSTALL_HINT = (
+    "Install Playwright with:\n"
+    "  pip install playwright\n"
+    "Then install browser binaries with:\n"
+    "  playwright install chromium\n"
+    "Read more: https://playwright.dev/python/docs/intro"
+)
+
+# Extraction only needs the DOM
+BLOCKED_RESOURCES = {"image", "font", "media"}
+
+
+class BrowserPool():
+    """Long-lived headless Chromium workers for rendering pages.
+
+    Playwright's sync API is bound to the thread that started it, so each
+    worker thread owns one browser and renders one page at a time in a fresh
+    context. Workers are started lazily, up to `size`, and stay alive until
+    close() is called.
+    """
+
+    def __init__(self, size: int = 2, block_resources: bool = True):
+        self.size = max(1, size)
+        self.block_resources = block_resources
+        self._jobs = queue.Queue()
+        self._workers = []
+        self._busy = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def render(self, url: str, wait_strategy: str = "networkidle", timeout: int = 2000) -> str:
+        """Load a page and return its HTML.
+
+        Raises TimeoutError if navigation times out. A timeout while waiting
+        for the load state returns whatever content has loaded so far.
+        """
+        future = Future()
+        self._start_worker()
+        self._jobs.put((url, wait_strategy, timeout, future))
+        return future.result()
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._jobs.put(None)
+        for worker in workers:
+            worker.join()
+        if workers:
+            logging.debug(f"Closed {len(workers)} browser worker(s)")
+
+    def _start_worker(self):
+        with self._lock:
+            # Only add a browser when every running worker is busy
+            if len(self._workers) >= self.size or self._busy + self._jobs.qsize() < len(self._workers):
+                return
+            worker = threading.Thread(target=self._run, name=f"browser-{len(self._workers)}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _run(self):
+        try:
+            # Imported here so commands that never render don't pay for Playwright
+            from playwright.sync_api import sync_playwright
+            with sync_playwright() as p:
+                browser = p.chromium.launch(headless=True)
+                logging.debug(f"[{threading.current_thread().name}] Chromium started")
+                try:
+                    while True:
+                        job = self._jobs.get()
+                        if job is None:
+                            break
+                        url, wait_strategy, timeout, future = job
+                        if not future.set_running_or_notify_cancel():
+                            continue
+                        with self._lock:
+                            self._busy += 1
+                        try:
+                            future.set_result(self._render(browser, url, wait_strategy, timeout))
+                        except BaseException as e:
+                            future.set_exception(e)
+                        finally:
+                            with self._lock:
+                                self._busy -= 1
+                finally:
+                    browser.close()
+        except BaseException as e:
+            # Fail everything still queued so callers don't block forever
+            logging.error(f"Browser worker failed: {type(e).__name__}: {e}\n{PLAYWRIGHT_INSTALL_HINT}")
+            with self._lock:
+                if threading.current_thread() in self._workers:
+                    self._workers.remove(threading.current_thread())
+            while True:
+                try:
+                    job = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None and job[3].set_running_or_notify_cancel():
+                    job[3].set_exception(e)
+
+    def _render(self, browser, url, wait_strategy, timeout) -> str:
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+        context = browser.new_context()
+        try:
+            if self.block_resources:
+                context.route("**/*", self._route_handler(url))
+            page = context.new_page()
+            page.set_default_timeout(timeout)
+            try:
+                page.goto(url, timeout=timeout)
+            except PlaywrightTimeoutError as e:
+                raise TimeoutError(str(e)) from e
+
+            try:
+                if wait_strategy == "networkidle":
+                    page.wait_for_load_state("networkidle", timeout=timeout)
+                else:
+                    page.wait_for_load_state("domcontentloaded", timeout=timeout)
+            except PlaywrightTimeoutError:
+                logging.debug(f"[PARTIAL] Got partial content before timeout [{urlparse(url).netloc}]")
+            return page.content()
+        finally:
+            context.close()
+
+    def _route_handler(self, url):
+        site = _site(urlparse(url).hostname or "")
+
+        def handle(route):
+            request = route.request
+            if request.resource_type in BLOCKED_RESOURCES:
+                return route.abort()
+            if request.resource_type == "script" and _site(urlparse(request.url).hostname or "") != site:
+                return route.abort()
+            return route.continue_()
+        return handle
+
+
+def validate() -> None:
+    """Launch and close Chromium once, raising if Playwright is not usable."""
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        logging.error(f"Playwright is not installed.\n{PLAYWRIGHT_INSTALL_HINT}")
+        raise
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        browser.close()
+
+
+def _site(host: str) -> str:
+    """Registrable domain, used to tell first-party from third-party requests.
+
+    Hosts without a public suffix, such as IP addresses, are their own site.
+    """
+    return _extractor()(host.lower()).top_domain_under_public_suffix or host.lower()
+
+
+@functools.cache
+def _extractor():
+    # The bundled public suffix list, so telling sites apart never touches the network
+    return tldextract.TLDExtract(suffix_list_urls=())
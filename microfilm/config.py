@@ -1,29 +1,96 @@
-from newspaper import Config as NewspaperConfig
 from pathlib import Path
 import yaml
 from dataclasses import dataclass, field
+from functools import cache, cached_property
 import logging
 
+@dataclass
+class Feed:
+    url: str
+    author_filter: str | list[str] | dict = ""
+    formats: list[str] = field(default_factory=lambda: ['html', 'json'])
+
 @dataclass
 class Config:
-    rss: str
-    author_filter: str
+    rss: list[Feed]
+    author_filter: str | list[str] | dict
     update_frequency: int
     formats: list[str]
     output_directory: Path
     template_directory: Path
     timeout: int
     thread_count: int = 4
-    newspaper: NewspaperConfig = field(default_factory=lambda: NewspaperConfig())
     playwright_retry_attempts: int = 2
     playwright_wait_strategy: str = "networkidle"
+    per_host_limit: int = 2
+    browser_pool_size: int = 2
+    per_host_rate: float = 0
+    download_retries: int = 1
+    download_backoff: float = 2.0
+    build_processes: int = 0
+    download_chunk_size: int = 500
+    metrics_directory: Path = Path('metrics')
+    site_index: bool = True
+    listing_page_size: int = 50
+    storage: str = "files"
+    segment_compression: str = "gzip"
+    segment_size: int = 64
+    page_cache: bool = True
+    page_cache_directory: Path = Path('.cache/pages')
+    page_cache_size: int = 1024
+    adaptive_routing: bool = True
+    routing_probe_interval: int = 20
+    watch_min_interval: int = 300
+    watch_max_interval: int = 86400
+    watch_concurrency: int = 2
+    parse_processes: int = 0
+    download_in_flight: int = 0
+    near_duplicate_distance: int = 3
+    vendor_assets: bool = True
+    minify_html: bool = False
+    precompress: list[str] = field(default_factory=lambda: ['gzip', 'br'])
+
+    @cached_property
+    def newspaper(self):
+        # newspaper is slow to import, only pay for it when articles are fetched
+        from newspaper import Config as NewspaperConfig
+        return NewspaperConfig()
 
 # Define module and project roots
 MODULE_ROOT = Path(__file__).resolve().parent.resolve()
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 config_path = Path.joinpath(PROJECT_ROOT, 'config.yaml')
 
+def _load_feeds(rss, author_filter, formats: list[str]) -> list[Feed]:
+    '''
+    Accept a single feed URL, a list of URLs, or a list of mappings with
+    per-feed 'author_filter' and 'formats' overrides.
+    '''
+    if not rss:
+        return []
+    if isinstance(rss, (str, dict)):
+        rss = [rss]
+
+    feeds = []
+    for item in rss:
+        if isinstance(item, str):
+            feeds.append(Feed(url=item, author_filter=author_filter, formats=list(formats)))
+        elif isinstance(item, dict) and item.get('url'):
+            feeds.append(Feed(
+                url=item['url'],
+                author_filter=item.get('author_filter', author_filter),
+                formats=item.get('formats', list(formats)),
+            ))
+        else:
+            logging.warning(f"Ignoring invalid feed entry in config: {item}")
+    return feeds
+
+@cache
 def load_config() -> Config:
+    '''
+    Load config.yaml. The result is cached, so every caller in the process
+    shares one Config instance.
+    '''
     try:
         with open(config_path, 'r') as file:
             data = yaml.safe_load(file) or {}
@@ -31,19 +98,50 @@ def load_config() -> Config:
         # Convert directory strings to paths and resolve relative paths
         data['output_directory'] = (PROJECT_ROOT / data.get('output_directory', 'site')).resolve()
         data['template_directory'] = (PROJECT_ROOT / data.get('template_directory', 'templates')).resolve()
+        data['metrics_directory'] = (PROJECT_ROOT / data.get('metrics_directory', 'metrics')).resolve()
+        data['page_cache_directory'] = (PROJECT_ROOT / data.get('page_cache_directory', '.cache/pages')).resolve()
+
+        author_filter = data.get('author_filter', '')
+        formats = data.get('formats', ['html', 'json'])
 
         config = Config(**{
-            'rss': data.get('rss', ''),
-            'author_filter': data.get('author_filter', ''),
+            'rss': _load_feeds(data.get('rss'), author_filter, formats),
+            'author_filter': author_filter,
             'update_frequency': data.get('update_frequency', 1800),
-            'formats': data.get('formats', ['html', 'json']),
+            'formats': formats,
             'output_directory': data['output_directory'],
             'template_directory': data['template_directory'],
             'timeout': data.get('timeout', 2000),
             'thread_count': data.get('thread_count', 4),
             'playwright_retry_attempts': data.get('playwright_retry_attempts', 2),
             'playwright_wait_strategy': data.get('playwright_wait_strategy', 'networkidle'),
-            'newspaper': NewspaperConfig()
+            'per_host_limit': data.get('per_host_limit', 2),
+            'browser_pool_size': data.get('browser_pool_size', 2),
+            'per_host_rate': data.get('per_host_rate', 0),
+            'download_retries': data.get('download_retries', 1),
+            'download_backoff': data.get('download_backoff', 2.0),
+            'build_processes': data.get('build_processes', 0),
+            'download_chunk_size': data.get('download_chunk_size', 500),
+            'metrics_directory': data['metrics_directory'],
+            'site_index': data.get('site_index', True),
+            'listing_page_size': data.get('listing_page_size', 50),
+            'storage': data.get('storage', 'files'),
+            'segment_compression': data.get('segment_compression', 'gzip'),
+            'segment_size': data.get('segment_size', 64),
+            'page_cache': data.get('page_cache', True),
+            'page_cache_directory': data['page_cache_directory'],
+            'page_cache_size': data.get('page_cache_size', 1024),
+            'adaptive_routing': data.get('adaptive_routing', True),
+            'routing_probe_interval': data.get('routing_probe_interval', 20),
+            'watch_min_interval': data.get('watch_min_interval', 300),
+            'watch_max_interval': data.get('watch_max_interval', 86400),
+            'watch_concurrency': data.get('watch_concurrency', 2),
+            'parse_processes': data.get('parse_processes', 0),
+            'download_in_flight': data.get('download_in_flight', 0),
+            'near_duplicate_distance': data.get('near_duplicate_distance', 3),
+            'vendor_assets': data.get('vendor_assets', True),
+            'minify_html': data.get('minify_html', False),
+            'precompress': data.get('precompress', ['gzip', 'br']) or [],
         })
         return config
 
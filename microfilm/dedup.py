@@ -0,0 +1,160 @@
+# Module imports
+import hashlib
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "yclid", "_ga", "_gl",
+    "ref", "ref_src", "ref_url", "cmpid", "smid", "smtyp", "ocid", "taid", "sr_share",
+    "amp", "outputtype",
+}
+TRACKING_PREFIXES = ("utm_", "at_", "pk_", "mtm_", "hsa_")
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Bits in a fingerprint, split into bands for candidate lookup
+SIMHASH_BITS = 64
+BANDS = 4
+# Shorter texts (paywall stubs, error pages) look alike without being the same story
+MIN_WORDS = 50
+
+
+def canonicalize(url: str) -> str:
+    """Normalize a URL so trivially different links to one article compare equal.
+
+    Lowercases scheme and host, drops default ports, fragments, tracking
+    parameters and AMP markers, sorts the remaining query and removes
+    trailing slashes.
+    """
+    if not url:
+        return url
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+    if parts.scheme not in DEFAULT_PORTS:
+        return url
+
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS[parts.scheme]:
+        host = f"{host}:{parts.port}"
+
+    path = re.sub(r"/{2,}", "/", parts.path or "/")
+    path = re.sub(r"(/amp)+/?$", "", path)
+    path = re.sub(r"\.amp(\.html?)$", r"\1", path)
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    ]
+    return urlunsplit((parts.scheme.lower(), host, path or "/", urlencode(sorted(query)), ""))
+
+
+def page_canonical(url: str, declared: str | None) -> str:
+    """The canonical URL an article page declares, or `url` if it declares none worth trusting.
+
+    Links to a site's front page are ignored, a common template mistake that
+    would otherwise fold every article on the site into one.
+    """
+    if declared:
+        declared = canonicalize(declared)
+        parts = urlsplit(declared)
+        if parts.scheme in DEFAULT_PORTS and parts.hostname and parts.path.strip("/"):
+            return declared
+    return canonicalize(url)
+
+
+def simhash(text: str) -> int | None:
+    """64-bit SimHash over word 3-shingles, stable across processes. None for short texts."""
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+class DuplicateIndex():
+    """Content fingerprints of archived articles, for near-duplicate lookups.
+
+    Fingerprints within `distance` bits of each other are near duplicates.
+    Each is stored with its four 16-bit bands indexed; any two fingerprints
+    at most three bits apart share a band, so candidates come from four
+    index lookups instead of a scan.
+    """
+
+    def __init__(self, database: Path, distance: int = 3):
+        self.distance = min(distance, BANDS - 1)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(database, check_same_thread=False, timeout=30)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                url TEXT PRIMARY KEY,
+                simhash INTEGER NOT NULL,
+                band0 INTEGER NOT NULL,
+                band1 INTEGER NOT NULL,
+                band2 INTEGER NOT NULL,
+                band3 INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS fingerprints_band0 ON fingerprints (band0);
+            CREATE INDEX IF NOT EXISTS fingerprints_band1 ON fingerprints (band1);
+            CREATE INDEX IF NOT EXISTS fingerprints_band2 ON fingerprints (band2);
+            CREATE INDEX IF NOT EXISTS fingerprints_band3 ON fingerprints (band3);
+            """
+        )
+        self._db.commit()
+
+    def find(self, fingerprint: int, exclude: str = None) -> str | None:
+        """URL of an archived near duplicate of `fingerprint`, other than `exclude`."""
+        bands = _bands(fingerprint)
+        with self._lock:
+            rows = self._db.execute(
+                """
+                SELECT url, simhash FROM fingerprints
+                WHERE band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?
+                """,
+                bands,
+            ).fetchall()
+        for url, stored in rows:
+            if url != exclude and bin((stored & (2**64 - 1)) ^ fingerprint).count("1") <= self.distance:
+                return url
+        return None
+
+    def add(self, url: str, fingerprint: int):
+        self.add_many([(url, fingerprint)])
+
+    def add_many(self, items):
+        """Store several (url, fingerprint) pairs in one transaction."""
+        # SQLite integers are signed
+        rows = [
+            (url, fingerprint - 2**64 if fingerprint >= 2**63 else fingerprint, *_bands(fingerprint))
+            for url, fingerprint in items if url
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO fingerprints (url, simhash, band0, band1, band2, band3) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _bands(fingerprint: int) -> tuple[int, ...]:
+    width = SIMHASH_BITS // BANDS
+    return tuple(fingerprint >> (i * width) & (2**width - 1) for i in range(BANDS))
@@ -8,78 +8,184 @@ import microfilm
 import typer
 import config
 
-import time
+from metrics import profiled
+
+import functools
+import os
+import signal
+import threading
 
 logger = logging.getLogger(__name__)
 
 
 app = typer.Typer(no_args_is_help=True)
-micro = microfilm.Microfilm()
 cfg = config.load_config()
 
-# Validate playwright installation if needed
-try:
-    from playwright.sync_api import sync_playwright
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        browser.close()
-    logging.debug("Playwright validation: chromium binaries available")
-except ImportError:
-    logging.error(
-        "Playwright is not installed. Install it with:\n"
-        "  pip install playwright\n"
-        "Then install browser binaries with:\n"
-        "  playwright install chromium"
-    )
-    raise
-except Exception as e:
-    logging.error(f"Playwright validation failed: {type(e).__name__}: {e}\nFix with: playwright install chromium")
-    raise
+
+@functools.cache
+def _microfilm() -> "microfilm.Microfilm":
+    # Created on first use so --help and argument errors stay instant
+    return microfilm.Microfilm()
+
+
+def _profile_single_threaded():
+    # Concurrent threads garble a cProfile profile and parse workers are invisible to it
+    logging.info("Profiling with one feed, one download thread and in-thread parsing")
+    cfg.watch_concurrency = 1
+    cfg.thread_count = 1
+    cfg.parse_processes = 1
 
 
 @app.command()
-def watch():
+def watch(profile: bool = typer.Option(False, "--profile", help="Dump cProfile and tracemalloc output for the first feed run, polling one feed at a time on one thread")):
     '''
-    Watch RSS feed for changes and generate site
+    Watch RSS feeds, polling each on its own schedule, and generate site
     '''
+    stop = threading.Event()
+
+    def shutdown(signum, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt
+        logging.info("Stopping after in-flight feeds finish, press Ctrl+C again to abort")
+        stop.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    if profile:
+        _profile_single_threaded()
     try:
-        while True:
-            try:
-                micro.generate()
-            except Exception as e:
-                logging.error(f"Error in watch cycle: {type(e).__name__}: {e}", exc_info=True)
-            logging.info(f"Sleeping for {cfg.update_frequency} seconds")
-            time.sleep(cfg.update_frequency)
+        _microfilm().watch(stop, profile=profile)
     except KeyboardInterrupt:
-        logging.info('Manual break by user')
+        logging.info('Aborted by user, in-flight feeds were not finished')
+        logging.shutdown()
+        # Exit without the interpreter joining the abandoned worker threads
+        os._exit(130)
     
 @app.command()
-def scrape():
+def scrape(profile: bool = typer.Option(False, "--profile", help="Dump cProfile and tracemalloc output for this cycle, run on one thread")):
     '''
     Scrape RSS feed and generate files
     '''
     try:
-        micro.generate()
+        if profile:
+            _profile_single_threaded()
+            with profiled(cfg.metrics_directory, "scrape"):
+                _microfilm().generate()
+        else:
+            _microfilm().generate()
     except Exception as e:
         logging.error(f"Scrape failed: {type(e).__name__}: {e}", exc_info=True)
     except KeyboardInterrupt:
         logging.info('Manual break by user')
         
 @app.command()
-def build():
+def build(full: bool = typer.Option(False, "--full", help="Re-render every article, ignoring the build manifest")):
     '''
     Build static site from existing articles
     '''
     try:
-        micro.regenerate()
+        _microfilm().regenerate(full=full)
     except Exception as e:
         logging.error(f"Build failed: {type(e).__name__}: {e}", exc_info=True)
         
+@app.command()
+def vendor():
+    '''
+    Copy the CSS/JS the templates load into the site, for offline pages
+    '''
+    try:
+        _microfilm().vendor()
+    except Exception as e:
+        logging.error(f"Vendoring failed: {type(e).__name__}: {e}", exc_info=True)
+
+@app.command()
+def reindex():
+    '''
+    Rebuild the archive index from existing JSON files or segments, backfilling dedup state
+    '''
+    try:
+        _microfilm().reindex()
+    except Exception as e:
+        logging.error(f"Reindex failed: {type(e).__name__}: {e}", exc_info=True)
+
+@app.command()
+def migrate(remove: bool = typer.Option(False, "--remove", help="Delete each JSON file once it is in a segment")):
+    '''
+    Convert an archive of per-article JSON files into compressed segments
+    '''
+    try:
+        _microfilm().migrate(remove=remove)
+    except Exception as e:
+        logging.error(f"Migration failed: {type(e).__name__}: {e}", exc_info=True)
+
+@app.command()
+def export(formats: list[str] = typer.Option(["json", "html"], "--format", help="Format to export, may be repeated")):
+    '''
+    Write per-article files for every article held in segments
+    '''
+    try:
+        _microfilm().export(formats)
+    except Exception as e:
+        logging.error(f"Export failed: {type(e).__name__}: {e}", exc_info=True)
+
+@app.command()
+def reparse(processes: int = typer.Option(0, "--processes", help="Worker processes, 0 for build_processes or one per CPU")):
+    '''
+    Re-extract archived articles from cached pages, without the network
+    '''
+    try:
+        _microfilm().reparse(processes)
+    except Exception as e:
+        logging.error(f"Reparse failed: {type(e).__name__}: {e}", exc_info=True)
+
+@app.command()
+def ingest(
+    paths: list[str] = typer.Argument(..., help=".warc or .warc.gz files and directories of saved HTML pages"),
+    processes: int = typer.Option(0, "--processes", help="Parse worker processes, 0 for parse_processes or one per CPU"),
+):
+    '''
+    Archive pages from WARC files and saved HTML, without the network
+    '''
+    try:
+        _microfilm().ingest(paths, processes)
+    except Exception as e:
+        logging.error(f"Ingest failed: {type(e).__name__}: {e}", exc_info=True)
+
 @app.command()
 def download(f: str):
+    '''
+    Archive URLs from a .txt, .csv, .jsonl or sitemap .xml file (optionally .gz)
+    '''
     try:
-        micro.download_articles(f)
+        _microfilm().download_articles(f)
     except Exception as e:
         logging.error(f"Failed to download articles from {f}: {type(e).__name__}: {e}", exc_info=True)
+@app.command()
+def doctor():
+    '''
+    Check the config, output directory and Playwright installation
+    '''
+    import browser
+
+    ok = True
+    logging.info(f"Config loaded: {len(cfg.rss)} feed(s), formats {cfg.formats}")
+    try:
+        cfg.output_directory.mkdir(parents=True, exist_ok=True)
+        logging.info(f"Output directory is writable: {cfg.output_directory}")
+    except OSError as e:
+        logging.error(f"Output directory is not writable: {e}")
+        ok = False
+    if not cfg.template_directory.exists():
+        logging.error(f"Template directory does not exist: {cfg.template_directory}")
+        ok = False
+    try:
+        browser.validate()
+        logging.info("Playwright validation: chromium binaries available")
+    except Exception as e:
+        logging.error(f"Playwright validation failed: {type(e).__name__}: {e}\nFix with: playwright install chromium")
+        ok = False
+    if not ok:
+        raise typer.Exit(code=1)
+
 if __name__ == "__main__":
     app()
\ No newline at end of file
@@ -0,0 +1,223 @@
+# Module imports
+import cProfile
+import json
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from writer import FileWriter
+
+
+class Metrics():
+    """Process-wide counters and timers for scrape, watch and download runs.
+
+    Counters and timers are cumulative for the life of the process, which is
+    what the Prometheus textfile exposes. run() additionally produces a JSON
+    summary of what changed during one run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            count, total, peak = self._timers.get(key, (0, 0.0, 0.0))
+            self._timers[key] = (count + 1, total + seconds, max(peak, seconds))
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def error(self, e: BaseException, stage: str):
+        self.incr("errors", stage=stage, type=type(e).__name__)
+
+    def snapshot(self) -> tuple[dict, dict]:
+        with self._lock:
+            return dict(self._counters), dict(self._timers)
+
+    @contextmanager
+    def run(self, name: str, directory: Path):
+        """Record one run and export its summary and the cumulative metrics afterwards."""
+        counters, timers = self.snapshot()
+        started = datetime.now(timezone.utc)
+        try:
+            with self.timer("run", command=name):
+                yield self
+        finally:
+            try:
+                self.export(directory, self._summary(name, started, counters, timers))
+            except OSError as e:
+                logging.warning(f"Could not export metrics to {directory}: {e}")
+
+    @contextmanager
+    def intervals(self, name: str, directory: Path):
+        """Yield a function exporting a summary of everything since its previous call.
+
+        For runs that overlap, where run() would count one run's work in the
+        other's summary too. Every change lands in exactly one summary.
+        """
+        lock = threading.Lock()
+        last = [*self.snapshot(), datetime.now(timezone.utc)]
+
+        def summarize():
+            with lock:
+                counters, timers, started = last
+                current = self.snapshot()
+                summary = self._summary(name, started, counters, timers, current)
+                # The next summary starts where this one finished
+                last[:] = [*current, datetime.fromisoformat(summary["finished_at"])]
+                # Exported under the lock, so runs.jsonl stays in order
+                try:
+                    self.export(directory, summary)
+                except OSError as e:
+                    logging.warning(f"Could not export metrics to {directory}: {e}")
+
+        yield summarize
+
+    def export(self, directory: Path, summary: dict):
+        directory = Path(directory)
+        writer = FileWriter()
+        writer.write(Path.joinpath(directory, "last_run.json"), json.dumps(summary, indent=4))
+        writer.write(Path.joinpath(directory, "microfilm.prom"), self.prometheus())
+        with open(Path.joinpath(directory, "runs.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary) + "\n")
+        logging.info(f"Run summary: {_format_summary(summary)}")
+
+    def prometheus(self) -> str:
+        counters, timers = self.snapshot()
+        lines = []
+        for name in sorted({key[0] for key in counters}):
+            lines.append(f"# TYPE microfilm_{name}_total counter")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"microfilm_{name}_total{_labels(labels)} {value}")
+        for name in sorted({key[0] for key in timers}):
+            series = [(labels, value) for (metric, labels), value in sorted(timers.items()) if metric == name]
+            lines.append(f"# TYPE microfilm_{name}_seconds summary")
+            for labels, (count, total, peak) in series:
+                lines.append(f"microfilm_{name}_seconds_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"microfilm_{name}_seconds_count{_labels(labels)} {count}")
+            lines.append(f"# TYPE microfilm_{name}_seconds_max gauge")
+            for labels, (count, total, peak) in series:
+                lines.append(f"microfilm_{name}_seconds_max{_labels(labels)} {peak:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def _summary(self, name, started, counters_before, timers_before, current=None) -> dict:
+        counters, timers = current or self.snapshot()
+        summary = {
+            "command": name,
+            "started_at": started.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "counters": {},
+            "timers": {},
+        }
+        for key, value in counters.items():
+            delta = value - counters_before.get(key, 0)
+            if delta:
+                summary["counters"][_key(key)] = delta
+        for key, (count, total, peak) in timers.items():
+            before = timers_before.get(key, (0, 0.0, 0.0))
+            if count - before[0]:
+                summary["timers"][_key(key)] = {
+                    "count": count - before[0],
+                    "seconds": round(total - before[1], 6),
+                    "max_seconds": round(peak, 6),
+                }
+        return summary
+
+
+@contextmanager
+def profiled(directory: Path, name: str):
+    """Dump cProfile stats and the top tracemalloc allocations for the enclosed code.
+
+    Threads started inside are profiled too. From Python 3.12 one profiler
+    sees every thread; before, each new thread gets its own and the stats
+    are merged. Calls from concurrent threads are attributed as if they
+    nested, so the timings only add up with a single worker thread, and
+    work done in other processes is not seen at all.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    profiler = cProfile.Profile()
+    thread_profilers = []
+    lock = threading.Lock()
+
+    def profile_thread(frame, event, arg):
+        # Replaces this hook with a profiler of the thread's own
+        thread_profiler = cProfile.Profile()
+        with lock:
+            thread_profilers.append(thread_profiler)
+        thread_profiler.enable()
+
+    per_thread = sys.version_info < (3, 12)
+    if per_thread:
+        threading.setprofile(profile_thread)
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if per_thread:
+            threading.setprofile(None)
+        stats = pstats.Stats(profiler)
+        with lock:
+            for thread_profiler in thread_profilers:
+                stats.add(thread_profiler)
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stats_path = Path.joinpath(directory, f"profile-{name}-{stamp}.pstats")
+        stats.dump_stats(stats_path)
+        memory_path = Path.joinpath(directory, f"memory-{name}-{stamp}.txt")
+        with open(memory_path, "w", encoding="utf-8") as f:
+            f.write(f"current: {current / 2**20:.1f} MiB, peak: {peak / 2**20:.1f} MiB\n\n")
+            for stat in snapshot.statistics("lineno")[:25]:
+                f.write(f"{stat}\n")
+        stats.sort_stats("cumulative").print_stats(15)
+        logging.info(f"Profile written to {stats_path} and {memory_path}")
+
+
+def _key(key) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _format_summary(summary: dict) -> str:
+    counters = ", ".join(f"{k}={v:g}" for k, v in sorted(summary["counters"].items()))
+    stages = ", ".join(
+        f"{k}={v['seconds']:.2f}s" for k, v in sorted(summary["timers"].items()) if k.startswith("stage")
+    )
+    return f"{stages}; {counters}" if stages else counters
+
+
+METRICS = Metrics()
@@ -1,22 +1,27 @@
+from __future__ import annotations
+
 # Internal dependencies
 import config
-import newspaper as np
-from newspaper.mthreading import fetch_news
-
-# External dependencies
-import feedparser
-try:
-    from playwright.sync_api import sync_playwright
-except ImportError:
-    def sync_playwright(*args, **kwargs):
-        raise ImportError(
-            "Playwright is not installed. Install it with:\n"
-            "  pip install playwright\n"
-            "Then install browser binaries with:\n"
-            "  playwright install chromium\n"
-            "Read more: https://playwright.dev/python/docs/intro"
-        )
-from jinja2 import Environment, FileSystemLoader
+from lazy import lazy_import
+from archive import ArchiveIndex, content_digest, json_articles
+from browser import BrowserPool
+from throttle import HostLimiter
+from writer import FileWriter
+from sources import UrlSource, PageSource
+from metrics import METRICS, profiled
+from siteindex import SiteIndex
+from segments import SegmentStore
+from pagecache import PageCache
+from authors import AuthorMatcher, entry_authors
+from routing import DomainRouter
+from scheduler import Scheduler, Poll, read_poll
+from dedup import DuplicateIndex, canonicalize, page_canonical, simhash
+from static import AssetStore, template_assets, minify_html
+
+# External dependencies, imported on first use to keep CLI startup fast
+np = lazy_import("newspaper")
+feedparser = lazy_import("feedparser")
+jinja2 = lazy_import("jinja2")
 
 # Module imports
 import time
@@ -26,6 +31,15 @@ import os
 import unicodedata
 from pathlib import Path
 import json
+import gzip
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import contextlib
+import functools
+import itertools
+import threading
 
 
 cfg = config.load_config()
@@ -38,130 +52,685 @@ logging.debug(f"PROJECT ROOT: {PROJECT_ROOT}")
 SITE_DIRECTORY = Path.joinpath(PROJECT_ROOT, cfg.output_directory)
 logging.debug(f"SITE DIRECTORY: {SITE_DIRECTORY}")
 
+# Below this many changed articles a build renders in-process
+BUILD_POOL_THRESHOLD = 200
+# Articles read from segments and rendered per batch, bounding memory on full builds
+BUILD_BATCH_SIZE = 2000
+# Pages queued per ingest worker, enough to keep every worker busy without holding more in memory
+INGEST_QUEUE_PER_PROCESS = 4
+
+# Failure messages of fetches worth retrying, for errors that carry no status or cause
+TRANSIENT_MESSAGE = re.compile(
+    r"(?:failed with|status(?: code)?:?) (?:429|5\d\d)\b|timed? ?out|connection (?:error|reset|refused|aborted)"
+    r"|net::ERR_(?:CONNECTION|TIMED_OUT|NETWORK)",
+    re.IGNORECASE,
+)
+
+WRITER = FileWriter(precompress=cfg.precompress)
+
 class Microfilm():
     def __init__(self):
-        self.etag = None
-        self.modified = None
-        self.rss = cfg.rss
-        self.filter = self._filter_author
+        self.feeds = cfg.rss
+        # Compiled once per feed, feeds without an override share the global filter
+        self.matchers = {feed.url: AuthorMatcher(feed.author_filter) for feed in self.feeds}
+        self.index = ArchiveIndex(cfg.output_directory)
+        # Kept across watch cycles so validators and seen entries carry over
+        self.newsgathers = {feed.url: Newsgather(feed.url, self.index) for feed in self.feeds}
+        # Chromium workers are started on first fallback and closed after each run
+        self.browser = BrowserPool(cfg.browser_pool_size)
+        self.limiter = HostLimiter(cfg.per_host_limit, cfg.per_host_rate)
+        # Raw and rendered pages, so articles can be re-extracted offline
+        self.pages = PageCache(self.index.path, cfg.page_cache_directory, cfg.page_cache_size * 2**20) if cfg.page_cache else None
+        # Per-domain record of which extraction strategy works
+        self.router = DomainRouter(self.index.path, default_strategies(), cfg.routing_probe_interval) if cfg.adaptive_routing else None
+        # Parse workers, started once at the beginning of each run
+        self.parser = None
+        # Feed runs overlap in watch mode, output is still written one run at a time
+        self._typeset_lock = threading.Lock()
         
     def generate(self):
-        articles = []
-        newsgather = Newsgather(self.rss)
-        feed = newsgather.gather()
-
-        results = fetch_news(list(feed), threads=cfg.thread_count)
-
-        filtered_articles = []
-        for article in results:
-            if self._filter_author(article):
-                downloaded = ArticleDownloader(article.url).download()
-                if downloaded:
-                    filtered_articles.append(downloaded)
-        Typeset().generator(filtered_articles)
+        try:
+            with METRICS.run("generate", cfg.metrics_directory), self._parse_workers():
+                self._generate()
+        finally:
+            self.browser.close()
+            if self.pages:
+                self.pages.evict()
+
+    @contextlib.contextmanager
+    def _parse_workers(self):
+        """Share one parse pool between every download batch of a run."""
+        with parse_pool() as self.parser:
+            try:
+                yield
+            finally:
+                self.parser = None
+
+    def watch(self, stop: threading.Event, profile: bool = False):
+        """Poll every feed on its own adaptive schedule until `stop` is set.
+
+        With `profile`, only the first feed run is profiled, so the dump
+        comes after one cycle rather than when the process exits. Feed runs
+        overlap, so a summary is exported as each one finishes, covering
+        everything since the previous summary rather than that feed alone.
+        """
+        first = threading.Lock()
+
+        def run(urls):
+            try:
+                if profile and first.acquire(blocking=False):
+                    with profiled(cfg.metrics_directory, "watch"):
+                        return self._poll_feeds(urls)
+                return self._poll_feeds(urls)
+            finally:
+                summarize()
+
+        scheduler = Scheduler(
+            [feed.url for feed in self.feeds], run,
+            cfg.update_frequency, cfg.watch_min_interval, cfg.watch_max_interval, cfg.watch_concurrency,
+        )
+        aborted = False
+        try:
+            with METRICS.intervals("watch", cfg.metrics_directory) as summarize, self._parse_workers():
+                scheduler.run(stop)
+        except KeyboardInterrupt:
+            # Aborting, the process exits without joining browser workers
+            aborted = True
+            raise
+        finally:
+            if not aborted:
+                self.browser.close()
+                if self.pages:
+                    self.pages.evict()
+
+    def _poll_feeds(self, urls: list[str]) -> dict[str, Poll]:
+        feeds = [feed for feed in self.feeds if feed.url in urls]
+        with METRICS.timer("run", command="watch"):
+            self._generate(feeds)
+        return {url: self.newsgathers[url].poll for url in urls}
+
+    def download_articles(self, file: str):
+        try:
+            with METRICS.run("download", cfg.metrics_directory), self._parse_workers():
+                self._download_articles(file)
+        finally:
+            self.browser.close()
+            if self.pages:
+                self.pages.evict()
+
+    def reparse(self, processes: int = 0):
+        """Re-extract every archived article from the page cache, without touching the network.
+
+        The newest raw response is tried first and the newest rendered DOM
+        if that yields no text, mirroring the download fallback.
+        """
+        if self.pages is None:
+            logging.error("The page cache is disabled, nothing to reparse")
+            return
+        with METRICS.run("reparse", cfg.metrics_directory):
+            typeset = Typeset(self.index)
+            generate = typeset.generators()
+            pages = (
+                (url, [str(self.pages.path(digests[kind])) for kind in PageCache.KINDS if kind in digests])
+                for url, digests in self.pages.archived()
+            )
+            processes = processes or cfg.build_processes or os.cpu_count() or 1
+            reparsed = failed = 0
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                while batch := list(itertools.islice(pages, BUILD_BATCH_SIZE)):
+                    for (url, _), data in zip(batch, pool.map(_reparse_page, batch, chunksize=16)):
+                        if data is None:
+                            failed += 1
+                            METRICS.incr("articles_failed", stage="reparse")
+                            continue
+                        try:
+                            generate(data)
+                            reparsed += 1
+                        except Exception as e:
+                            failed += 1
+                            logging.error(f"Error generating page for {url}: {type(e).__name__}: {e}")
+                            METRICS.error(e, stage="typeset")
+                    logging.info(f"Reparsed {reparsed} articles ({failed} failed)")
+            if typeset.site:
+                typeset.site.flush()
+
+    def ingest(self, paths: list[str], processes: int = 0):
+        """Archive pages from WARC files and saved HTML directories, without touching the network."""
+        sources = [PageSource(Path.joinpath(PROJECT_ROOT, path)) for path in paths]
+        with METRICS.run("ingest", cfg.metrics_directory):
+            for source in sources:
+                self._ingest(source, processes)
+
+    def _ingest(self, source: PageSource, processes: int = 0):
+        """Extract every page of one source in worker processes and archive the results.
+
+        The source is read lazily in this process and at most a few pages per
+        worker are queued, so memory stays flat however large the input is.
+        URLs are canonicalized and already archived ones are skipped before
+        they are parsed, so an interrupted ingest is cheap to run again.
+        """
+        typeset = Typeset(self.index)
+        generate = typeset.generators()
+        matcher = AuthorMatcher(cfg.author_filter)
+        processes = processes or cfg.parse_processes or os.cpu_count() or 1
+        pages = iter(source)
+        pending = {}
+        read = skipped = failed = archived = 0
+        started = last_report = time.monotonic()
+
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            while True:
+                while len(pending) < processes * INGEST_QUEUE_PER_PROCESS:
+                    page = next(pages, None)
+                    if page is None:
+                        break
+                    read += 1
+                    url = canonicalize(page[0])
+                    # WARCs often hold several captures of one URL, only the first is parsed
+                    if url in self.index or url in pending.values():
+                        skipped += 1
+                        METRICS.incr("articles_skipped", reason="archived")
+                        continue
+                    pending[pool.submit(extract_article, url, page[1])] = url
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    url = pending.pop(future)
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        logging.error(f"Error extracting {url}: {type(e).__name__}: {e}")
+                        METRICS.error(e, stage="ingest")
+                        data = None
+                    if not data:
+                        failed += 1
+                        METRICS.incr("articles_failed", stage="ingest")
+                        continue
+                    if not self._filter_author(data, matcher):
+                        METRICS.incr("articles_filtered", reason="author")
+                        continue
+                    if self._archived_as(url, data):
+                        continue
+                    try:
+                        with METRICS.timer("stage", stage="typeset"):
+                            if generate(data):
+                                archived += 1
+                                self.index.add_alias(url, data["url"])
+                    except Exception as e:
+                        logging.error(f"Error generating page for {url}: {type(e).__name__}: {e}", exc_info=True)
+                        METRICS.error(e, stage="typeset")
+                    if typeset.site and archived and archived % BUILD_BATCH_SIZE == 0:
+                        typeset.site.flush()
+
+                now = time.monotonic()
+                if now - last_report >= 10 or not pending:
+                    last_report = now
+                    progress = source.progress()
+                    progress = f" ({progress:.1%} of input)" if progress is not None else ""
+                    rate = read / max(now - started, 1e-9)
+                    logging.info(
+                        f"Read {read} pages{progress}: {archived} archived, {skipped} already archived, "
+                        f"{failed} without an article ({rate:.1f}/s)"
+                    )
+
+        if typeset.site:
+            typeset.site.flush()
+        logging.info(f"Finished {source.path.name}: {read} pages read, {archived} articles archived")
+
+    def vendor(self) -> int:
+        """Copy the assets the templates load through asset() into the site.
+
+        This is the only step that fetches them. The next build re-renders
+        the pages to link the copies.
+        """
+        urls = template_assets(cfg.template_directory)
+        assets = AssetStore(Path.joinpath(Path(cfg.output_directory), "assets"), WRITER)
+        added = assets.vendor(urls)
+        missing = [url for url in urls if url not in assets.manifest]
+        logging.info(f"Vendored {added} asset(s) into {assets.directory}, {len(missing)} could not be fetched")
+        if not cfg.vendor_assets:
+            logging.info("Set 'vendor_assets: true' in config.yaml for pages to link the vendored copies")
+        return added
+
+    def _generate(self, feeds: list[config.Feed] = None):
+        feeds = self.feeds if feeds is None else feeds
+        with METRICS.timer("stage", stage="gather"):
+            work = self._gather_feeds(feeds)
+
+        # Drop anything already archived before touching the network
+        urls = [url for url in work if url not in self.index]
+        logging.info(f"Found {len(work)} new or changed feed entries, {len(urls)} not yet archived")
+        METRICS.incr("articles_skipped", len(work) - len(urls), reason="archived")
+
+        # Screen on feed bylines where the entry has them, the rest are filtered after parsing.
+        # A URL listed by several feeds is kept for each feed whose filter may still accept it.
+        screened = {}
+        for url in urls:
+            screened[url] = [
+                (feed, matched) for feed, authors in work[url]
+                if (matched := self.matchers[feed.url].matches(authors)) is not False
+            ]
+        rejected = sum(1 for url in urls if not screened[url])
+        urls = [url for url in urls if screened[url]]
+        if rejected:
+            logging.info(f"Skipped {rejected} entries whose feed bylines don't match the author filter")
+            METRICS.incr("articles_filtered", rejected, reason="feed_author")
+
+        # Links that could not be fetched or written, retried next cycle
+        failed = set()
+        if urls:
+            # Each URL is fetched and parsed once; Playwright is only used when that yields no text.
+            # Articles are written as they complete, so at most the in-flight window is held in memory.
+            downloader = BatchDownloader(self.browser, self.limiter, cache=self.pages, router=self.router, parser=self.parser)
+            typesets = {}
+            generated = 0
+            with METRICS.timer("stage", stage="download"):
+                for url, data in downloader.download(urls, total=len(urls)):
+                    if not data:
+                        # A page without an article is seen for good, only fetch errors are retried
+                        if url in downloader.transient:
+                            failed.add(url)
+                        continue
+                    accepted = [
+                        feed for feed, matched in screened[url]
+                        if matched or self._filter_author(data, self.matchers[feed.url])
+                    ]
+                    if not accepted:
+                        METRICS.incr("articles_filtered", reason="author")
+                        continue
+                    if self._archived_as(url, data):
+                        continue
+                    # Written in the formats of every feed that accepted it
+                    formats = tuple(dict.fromkeys(fmt for feed in accepted for fmt in feed.formats))
+                    if formats not in typesets:
+                        typesets[formats] = Typeset(self.index, list(formats))
+                    with METRICS.timer("stage", stage="typeset"), self._typeset_lock:
+                        added = typesets[formats].add(data)
+                    if added:
+                        generated += 1
+                        self.index.add_alias(url, data["url"])
+                    elif added is None:
+                        failed.add(url)
+
+            with METRICS.timer("stage", stage="typeset"), self._typeset_lock:
+                for typeset in typesets.values():
+                    if typeset.site:
+                        typeset.site.flush()
+            logging.info(f"Generated {generated} articles")
+
+        for feed in feeds:
+            self.newsgathers[feed.url].commit(failed)
+
+    def _gather_feeds(self, feeds: list[config.Feed]) -> dict:
+        """Gather all feeds concurrently, mapping new entry URLs to [(feed, bylines)].
+
+        Concurrency is capped globally by thread_count and per host by
+        per_host_limit. URLs are canonicalized, and one found in several feeds
+        is kept once, listing every feed in config order.
+        """
+        def gather(feed):
+            with self.limiter.slot(feed.url):
+                return self.newsgathers[feed.url].gather()
+
+        work = {}
+        with ThreadPoolExecutor(max_workers=cfg.thread_count) as pool:
+            futures = [(feed, pool.submit(gather, feed)) for feed in feeds]
+            for feed, future in futures:
+                try:
+                    links = future.result()
+                except Exception as e:
+                    logging.error(f"Failed to gather feed {feed.url}: {type(e).__name__}: {e}")
+                    METRICS.error(e, stage="gather")
+                    continue
+                for link, authors in links.items():
+                    work.setdefault(link, []).append((feed, authors))
+        return work
              
-    def regenerate(self):
-        for file in cfg.output_directory.rglob('*.json'):
-            with open(file, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                Typeset().html(data)
-
-    def download_articles(self, file: str):  
-        formats = [".txt"] # add more later
-        file_path = Path.joinpath(PROJECT_ROOT, file)
-        
-        if file_path.suffix in formats:
-            with open(file_path, mode="r") as f:
-                urls = [line.strip() for line in f]
-                
-                if urls:
-                    saved_urls = set(self._load_json_articles())
-                    new_urls = [url for url in urls if url not in saved_urls]
-
-                    logging.info(f"Found {len(urls)} total URLs, {len(new_urls)} new URLs to process")
-                    typeset = Typeset()
-                    for url in new_urls:
-                        logging.info(f"Processing URL: {url}")
-                        article = ArticleDownloader(url).download()
-
-                        if article:
-                            data = typeset._store_data(article)
-                            typeset.generators()(data)
-                            logging.info("Article processed successfully!")
-                        else:
-                            logging.warning(f"Failed to download article from {url}")
+    def regenerate(self, full: bool = False):
+        """Re-render HTML from the archived JSON files or segments.
+
+        Only articles whose content or templates changed since the last build
+        are rendered, unless `full` is set. Large builds fan out over a process pool.
+        """
+        template_hash = template_digest(cfg.template_directory)
+        manifest = {} if full else self.index.load_builds()
+        if cfg.storage == "segments":
+            entries, build = self._stale_records(manifest, template_hash), _build_record
         else:
-            logging.error(f"File format \"{file_path.suffix}\" is not supported")
-            raise ValueError
-        
-    def _filter_author(self, a):
-        filter = cfg.author_filter
+            entries, build = self._stale_files(manifest, template_hash), _build_article
+
+        typeset = Typeset(self.index)
+        if full and typeset.site:
+            typeset.site.invalidate()
+
+        total = rendered = unchanged = failed = 0
+        pool = None
+        processes = cfg.build_processes or os.cpu_count() or 1
+        try:
+            while batch := list(itertools.islice(entries, BUILD_BATCH_SIZE)):
+                total += len(batch)
+                stale = [item for item in batch if item is not None]
+                if not stale:
+                    continue
+                if processes > 1 and len(stale) >= BUILD_POOL_THRESHOLD:
+                    pool = pool or ProcessPoolExecutor(max_workers=processes)
+                    results = list(pool.map(build, stale, chunksize=64))
+                else:
+                    results = [build(item) for item in stale]
+
+                built = [r for r in results if r and r["rendered"]]
+                self.index.record_many((r["url"], r["slug"], "html", r["digest"]) for r in built)
+                self.index.record_builds(
+                    (r["name"], r["mtime_ns"], r["size"], r["content_hash"], template_hash) for r in results if r
+                )
+                if typeset.site:
+                    for r in built:
+                        typeset.site.add(r["listing"], r["slug"])
+                errors = sum(1 for r in results if r is None)
+                rendered += len(built)
+                failed += errors
+                unchanged += len(results) - len(built) - errors
+        finally:
+            if pool:
+                pool.shutdown()
+
+        if typeset.site:
+            typeset.site.flush()
+        logging.info(
+            f"Checked {total} articles: rendered {rendered}, {unchanged} unchanged, {failed} failed, "
+            f"{total - rendered - unchanged - failed} already up to date"
+        )
+
+    def _stale_files(self, manifest: dict, template_hash: str):
+        """Yield (path, known hash) for JSON files that may need building, None for up to date ones."""
+        json_path = Path.joinpath(Path(cfg.output_directory), "json")
+        for file in json_path.glob('*.json'):
+            st = file.stat()
+            built = manifest.get(file.name)
+            if built and built[3] == template_hash:
+                if built[0] == st.st_mtime_ns and built[1] == st.st_size:
+                    yield None
+                    continue
+                # Touched but possibly unchanged, let the worker compare hashes
+                yield (str(file), built[2])
+            else:
+                yield (str(file), None)
+
+    def _stale_records(self, manifest: dict, template_hash: str):
+        """Yield (name, hash, data, slug) for segment records that changed, None for up to date ones."""
+        for data in segment_store():
+            name = data.get("url") or data.get("title") or ""
+            content_hash = content_digest(data)
+            built = manifest.get(name)
+            if built and built[3] == template_hash and built[2] == content_hash:
+                yield None
+            else:
+                # Slugs are settled here, build workers never open the index
+                archived = self.index.get(data.get("url"))
+                slug = archived["slug"] if archived else _slugify(data.get("title") or "")
+                yield (name, content_hash, data, slug)
+
+    def reindex(self):
+        """Rebuild the index from the JSON files or segments, backfilling URL aliases and fingerprints."""
+        if cfg.storage == "segments":
+            def articles():
+                # Same first-come rule as writing, segments are in write order
+                owners = {}
+                for data in segment_store():
+                    slug, url = _slugify(data.get("title") or ""), data.get("url")
+                    if owners.setdefault(slug, url) != url:
+                        slug = _collision_slug(slug, url)
+                    yield slug, data
+            return self.index.rebuild(cfg.output_directory, self._backfill(articles()), store="segments")
+        json_path = Path.joinpath(Path(cfg.output_directory), "json")
+        return self.index.rebuild(cfg.output_directory, self._backfill(json_articles(json_path)))
+
+    def _backfill(self, articles):
+        """Pass (slug, data) pairs through, recording the dedup state of each.
+
+        Articles archived before URLs were canonicalized are stored under
+        their raw URL; its canonical form becomes an alias, so feed links
+        are recognized again. Their fingerprints are added for near-duplicate
+        checks.
+        """
+        duplicates = Typeset(self.index).duplicates
+        aliases, fingerprints = [], []
+        for slug, data in articles:
+            url = data.get("url")
+            if url:
+                aliases.append((canonicalize(url), url))
+                fingerprint = simhash(data.get("text")) if duplicates else None
+                if fingerprint is not None:
+                    fingerprints.append((url, fingerprint))
+            yield slug, data
+            if len(aliases) >= BUILD_BATCH_SIZE:
+                self.index.add_aliases(aliases)
+                if duplicates:
+                    duplicates.add_many(fingerprints)
+                aliases, fingerprints = [], []
+        self.index.add_aliases(aliases)
+        if duplicates:
+            duplicates.add_many(fingerprints)
+        logging.info("Backfilled canonical URL aliases and content fingerprints")
+
+    def migrate(self, remove: bool = False):
+        """Append every archived JSON file to the segment store."""
+        store = segment_store()
+        json_path = Path.joinpath(Path(cfg.output_directory), "json")
+        migrated = skipped = 0
+        for file in sorted(json_path.glob('*.json')):
+            try:
+                data = json.loads(file.read_bytes())
+            except (json.JSONDecodeError, IOError) as e:
+                logging.warning(f"Could not read JSON file {file}: {e}")
+                continue
+            url = data.get("url")
+            if url and url in store:
+                skipped += 1
+            else:
+                store.append(data)
+                self.index.record(url, file.stem, "segments", content_digest(data))
+                migrated += 1
+            if remove:
+                WRITER.remove(file)
+        logging.info(f"Migrated {migrated} articles into {store.directory}, {skipped} were already there")
+        if cfg.storage != "segments":
+            logging.info("Set 'storage: segments' in config.yaml to archive new articles to segments")
+
+    def export(self, formats: list[str] = None):
+        """Write per-article files for every article in the segment store."""
+        typeset = Typeset(self.index, formats or ["json", "html"])
+        generate = typeset.generators(archive=False)
+        exported = 0
+        for data in segment_store():
+            try:
+                generate(data)
+                exported += 1
+            except Exception as e:
+                logging.error(f"Error exporting {data.get('url')}: {type(e).__name__}: {e}")
+                METRICS.error(e, stage="export")
+        if typeset.site:
+            typeset.site.flush()
+        logging.info(f"Exported {exported} articles as {', '.join(typeset.formats)}")
+
+    def _download_articles(self, file: str):
+        """Archive every URL in an input file, streaming it in checkpointed chunks."""
+        file_path = Path.joinpath(PROJECT_ROOT, file)
+        source = UrlSource(file_path)
+
+        position = self.index.load_checkpoint(source.key)
+        if position:
+            logging.info(f"Resuming {file_path.name} after {position} already processed URLs")
+
+        typeset = Typeset(self.index)
+        generate = typeset.generators()
+        downloader = BatchDownloader(self.browser, self.limiter, cache=self.pages, router=self.router, parser=self.parser)
+
+        urls = itertools.islice(iter(source), position, None)
+        started = time.monotonic()
+        start_progress = None
+        processed = archived = 0
+
+        while chunk := list(itertools.islice(urls, cfg.download_chunk_size)):
+            if start_progress is None:
+                start_progress = source.progress()
+            new_urls = [url for url in dict.fromkeys(map(canonicalize, chunk)) if url not in self.index]
+
+            METRICS.incr("articles_skipped", len(chunk) - len(new_urls), reason="archived")
+
+            for url, article in downloader.download(new_urls, total=len(new_urls)):
+                if not article or self._archived_as(url, article):
+                    continue
+                try:
+                    if generate(article):
+                        archived += 1
+                        self.index.add_alias(url, article["url"])
+                except Exception as e:
+                    logging.error(f"Error generating page for {url}: {type(e).__name__}: {e}", exc_info=True)
+                    METRICS.error(e, stage="typeset")
+
+            if typeset.site:
+                typeset.site.flush()
+            processed += len(chunk)
+            position += len(chunk)
+            self.index.save_checkpoint(source.key, position)
+            self._log_import_progress(source, processed, archived, started, start_progress)
+
+        self.index.clear_checkpoint(source.key)
+        logging.info(f"Finished {file_path.name}: {processed} URLs processed, {archived} articles archived")
+
+    def _archived_as(self, url: str, data: dict) -> bool:
+        """True if the page declared a different canonical URL that is already archived."""
+        canonical = data.get("url")
+        if not canonical or canonical == url or canonical not in self.index:
+            return False
+        logging.info(f"Already archived as {canonical}: {url}")
+        METRICS.incr("articles_skipped", reason="canonical")
+        self.index.add_alias(url, canonical)
+        return True
+
+    def _log_import_progress(self, source, processed, archived, started, start_progress):
+        elapsed = time.monotonic() - started
+        progress = source.progress()
+        done = progress - (start_progress or 0)
+        eta = ""
+        if 0 < done and progress < 1:
+            remaining = elapsed * (1 - progress) / done
+            eta = f", ETA {int(remaining // 3600)}:{int(remaining % 3600 // 60):02d}:{int(remaining % 60):02d}"
+        logging.info(f"Processed {processed} URLs ({progress:.1%} of input), {archived} archived{eta}")
         
-        if not filter or filter == "":
+    def _filter_author(self, data: dict, matcher: AuthorMatcher = None):
+        if matcher is None:
+            matcher = AuthorMatcher(cfg.author_filter)
+
+        if not matcher:
             return True
 
-        elif a.authors:
-            for author in a.authors:
-                if filter.lower() in author.lower():
+        if data.get("author"):
+            for author in data["author"]:
+                if matcher.match(author):
                     logging.debug(f"Article matched author filter: {author}")
                     return True
-            logging.debug(f"Article rejected by author filter (looking for: {filter})")
-        else:
-            logging.debug(f"Article rejected by author filter (looking for: {filter})")
-            return False
-    def _load_json_articles(self) -> list[str]:
-        stored_urls = []
-        json_path = Path.joinpath(SITE_DIRECTORY, "json")
-        try:
-            # Iterate through all JSON files in the directory
-            for json_file in SITE_DIRECTORY.glob('*.json'):
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        url = data.get("url")
-                        if url:
-                            stored_urls.append(url)
-                except (json.JSONDecodeError, IOError) as e:
-                    logging.warning(f"Could not read JSON file {json_file}: {e}")
-                    continue
-        except Exception as e:
-            logging.error(f"Error loading JSON articles: {e}")
-        
-        logging.info(f"Loaded {len(stored_urls)} existing URLs")
-        return stored_urls
+        logging.debug(f"Article rejected by author filter (looking for: {matcher.spec})")
+        return False
 
 class Newsgather():
-    def __init__(self, etag=None, modified=None):
-        self.etag = etag
-        self.modified = modified
+    def __init__(self, url: str, index: ArchiveIndex):
+        self.url = url
+        self.index = index
+        state = index.load_feed(url)
+        self.etag = state["etag"]
+        self.modified = state["modified"]
+        self.entries = state["entries"]
+        self._pending = None
+        # Scheduling hints from the latest fetch, an error until one succeeds
+        self.poll = Poll(error=True)
         
-    def gather(self) -> list[str]:
+    def gather(self) -> dict[str, list[str]]:
+        """Return canonical links for feed entries that are new or changed since the last commit.
+
+        Each link maps to the bylines the feed gives for it, empty if none.
+        Nothing is persisted until commit(), so if processing fails the same
+        entries are returned again.
+        """
         fetch = self.fetch
         status = self._get_status
-        articles = []
+        articles = {}
         
-        feed = fetch(cfg.rss)
+        self.poll = Poll(error=True)
+        feed = fetch(self.url)
         
         if status(feed) and feed is not None:
             feed_title = getattr(feed.feed, 'title', 'Unknown Feed')
             logging.info(f"Processing feed: {feed_title}")
+            entries = {}
+            keys = {}
             for entry in feed.entries:
                 if hasattr(entry, 'link') and entry.link:
-                    articles.append(str(entry.link))  # Store just the URL string
+                    key, digest = self._entry_key(entry)
+                    entries[key] = digest
+                    if self.entries.get(key) != digest:
+                        link = canonicalize(str(entry.link))
+                        articles[link] = entry_authors(entry)
+                        keys[link] = key
                 else:
                     entry_title = getattr(entry, 'title', 'Unknown Title')
                     logging.warning(f"Entry missing link: {entry_title}")
-                
+            logging.debug(f"{len(articles)}/{len(entries)} feed entries are new or changed")
+            self._pending = {
+                "etag": getattr(feed, "etag", self.etag),
+                "modified": getattr(feed, "modified", self.modified),
+                "entries": entries,
+                "keys": keys,
+            }
+
+        if feed is not None:
+            self.poll = read_poll(feed, len(articles))
         return articles
+
+    def commit(self, failed: set[str] = frozenset()):
+        """Persist validators and entry hashes once the gathered entries are processed.
+
+        Entries whose link is in `failed`, meaning a transient fetch error or
+        a write error, keep their previous hash, so they are returned again
+        by the next gather. Links that simply have no article are committed. The validators are only
+        advanced when nothing failed; otherwise the feed would answer 304
+        and those entries would not be seen again until it changed.
+        """
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            entries = pending["entries"]
+            retry = [key for link, key in pending["keys"].items() if link in failed]
+            for key in retry:
+                if key in self.entries:
+                    entries[key] = self.entries[key]
+                else:
+                    del entries[key]
+            self.entries = entries
+            if retry:
+                logging.info(f"{len(retry)} entries of {self.url} failed and will be retried")
+            else:
+                self.etag, self.modified = pending["etag"], pending["modified"]
+        self.index.save_feed(self.url, self.etag, self.modified, self.entries)
+
+    def _entry_key(self, entry) -> tuple[str, str]:
+        key = entry.get('id') or entry.link
+        fields = [entry.link, entry.get('title'), entry.get('updated'), entry.get('published'), entry.get('summary')]
+        digest = hashlib.sha1(json.dumps(fields, default=str).encode('utf-8')).hexdigest()
+        return key, digest
                 
     def fetch(self, url:str) -> feedparser.FeedParserDict:
         try:
-            feed = feedparser.parse(url,
-                                    etag=self.etag,
-                                    modified=self.modified)
+            with METRICS.timer("feed_fetch"):
+                feed = feedparser.parse(url,
+                                        etag=self.etag,
+                                        modified=self.modified)
             return feed
         except Exception as e:
             logging.warning(f"Could not scrape feed: {e}")
+            METRICS.error(e, stage="feed_fetch")
             raise
         
     def _get_status(self, feed):
@@ -169,34 +738,58 @@ class Newsgather():
             logging.warning(f"Feed is not valid")
             return False
         else:
+            if feed.get("status") in (429, 503):
+                logging.warning(f"Feed {self.url} asked us to slow down ({feed.status})")
+                METRICS.incr("feed_responses", status=feed.status)
+                return False
             if feed.bozo:
                 e = feed.bozo_exception
                 logging.warning(f"Feed is not valid: {e}")
+                METRICS.error(e, stage="feed_parse")
                 return False
             logging.debug(f"Feed status code: {feed.status}")
+            METRICS.incr("feed_responses", status=feed.status)
             if feed.status == 304:
                 logging.debug("Feed has not been updated")
+                METRICS.incr("feed_not_modified")
                 return False
             if feed.status in [200, 301, 302, 307, 308]:
-                if hasattr(feed, "etag"):
-                    self.etag = feed.etag
-                if hasattr(feed, "modified"):
-                    self.modified = feed.modified
                 return True
             
 class ArticleDownloader():
-    def __init__(self, url) -> None:
+    def __init__(self, url, browser: BrowserPool = None, cache: PageCache = None, router: DomainRouter = None,
+                 parser: ParsePool = None) -> None:
         self.url = url
-        #TODO Accept list[str] for batch processing?
+        self.browser = browser
+        self.cache = cache
+        self.router = router
+        # Extraction runs in this pool when given, keeping CPU work off the I/O threads
+        self.parser = parser
+        # Set when an attempt failed in a way a retry may fix, rather than finding no article
+        self.transient = False
 
-    def _create_article(self, url: str, html: str = None) -> np.Article:
-        """Create and parse an article from URL or HTML."""
+    def _create_article(self, url: str, html: str) -> np.Article:
+        """Parse an article from already fetched HTML."""
         article = np.Article(url=url, input_html=html, language='en', config=cfg.newspaper)
-        if not html:
-            article.download()
         article.parse()
         return article if article.text else None
 
+    def _fetch_html(self, url: str) -> str:
+        """Download the raw page without parsing it."""
+        article = np.Article(url=url, language='en', config=cfg.newspaper)
+        article.download()
+        if self.cache is not None:
+            self.cache.put(url, article.html, "raw")
+        return article.html
+
+    def _extract(self, url: str, html: str) -> dict | None:
+        if not html:
+            return None
+        if self.parser is not None:
+            with METRICS.timer("parse_wait"):
+                return self.parser.extract(url, html)
+        return extract_article(url, html)
+
     def _get_url_context(self, url):
         """Extract domain and path info for better error reporting."""
         try:
@@ -205,26 +798,49 @@ class ArticleDownloader():
             return f"{parsed.netloc} ({parsed.scheme}://{parsed.hostname})"
         except:
             return url[:50] + ("..." if len(url) > 50 else "")
-    def download(self):
-        url = self.url
-        try:
-            a = self._create_article(url)
+    def download(self) -> dict | None:
+        """Download and extract the article.
 
-            if a:
-                logging.info(f"Article downloaded successfully: {a.title}")
-                return a
-            else:
-                logging.info(f"No text found in: {url}")
-                # Try fulltext extraction as fallback
-                article = self._fulltext(url)
-                return article
+        Extraction strategies are tried in the order the router suggests for
+        the URL's domain, plain newspaper download first by default, and
+        each outcome is fed back to it. Returns the article data that
+        Typeset writes.
+        """
+        url = self.url
+        plan = self.router.plan(url) if self.router is not None else default_strategies()
+        for strategy in plan:
+            started = time.perf_counter()
+            data = self._attempt(strategy)
+            if self.router is not None:
+                self.router.record(url, strategy, data is not None, time.perf_counter() - started)
+            METRICS.incr("strategy_attempts", strategy=strategy, outcome="success" if data else "failure")
+            if data:
+                return data
+        return None
 
+    def _attempt(self, strategy: str) -> dict | None:
+        url = self.url
+        if strategy != "newspaper":
+            # The quicker wait mode gets more time, it is the one used when the other timed out
+            timeout = cfg.timeout if strategy == cfg.playwright_wait_strategy else cfg.timeout * 2
+            return self._fulltext(url, strategy, timeout)
+        try:
+            data = self._extract(url, self._fetch_html(url))
         except np.ArticleException as e:
             logging.error(f"ArticleException downloading [{self._get_url_context(url)}]: {e}")
-            return self._fulltext(url)
+            METRICS.error(e, stage="download")
+            self.transient |= _is_transient(e)
+            return None
         except Exception as e:
             logging.error(f"Unexpected error processing article [{self._get_url_context(url)}]: {type(e).__name__}: {e}", exc_info=True)
+            METRICS.error(e, stage="download")
+            self.transient |= _is_transient(e)
             return None
+        if data:
+            logging.info(f"Article downloaded successfully: {data['title']}")
+            return data
+        logging.info(f"No text found in: {url}")
+        return None
 
     def _validate_entry(self, entry):
         try:
@@ -244,99 +860,287 @@ class ArticleDownloader():
             logging.info(f"No text found in: {a.title}")
             return False
         
-    def _fulltext(self, url):
-        """Extract article text from page using Playwright browser."""
+    def _fulltext(self, url, wait_strategy=None, timeout=None):
+        """Extract article text from page using the shared Playwright browser pool."""
+        wait_strategy = wait_strategy or cfg.playwright_wait_strategy
+        METRICS.incr("fallback_invocations")
+        with METRICS.timer("fallback"):
+            try:
+                return self._fetch_page_content(url, wait_strategy=wait_strategy, timeout=timeout or cfg.timeout)
+            except TimeoutError:
+                logging.warning(f"[TIMEOUT] Fulltext extraction with {wait_strategy} timed out [{self._get_url_context(url)}]")
+                METRICS.incr("fallback_results", outcome="timeout", wait=wait_strategy)
+                self.transient = True
+                return None
+            except Exception as e:
+                logging.warning(f"[{type(e).__name__}] Fulltext extraction failed [{self._get_url_context(url)}]: {e}")
+                METRICS.incr("fallback_results", outcome="error", wait=wait_strategy)
+                METRICS.error(e, stage="fallback")
+                self.transient |= _is_transient(e)
+                return None
+
+    def _fetch_page_content(self, url, wait_strategy="networkidle", timeout=None):
+        """Render the page with the specified wait strategy and extract the article."""
+        logging.info(f"[FETCH] Loading {url} with {wait_strategy} strategy")
+        if self.browser is not None:
+            html = self.browser.render(url, wait_strategy, timeout or cfg.timeout)
+        else:
+            with BrowserPool(1) as browser:
+                html = browser.render(url, wait_strategy, timeout or cfg.timeout)
+        if self.cache is not None:
+            self.cache.put(url, html, "rendered")
+
+        article = self._extract(url, html)
+        if article:
+            logging.info(f"[SUCCESS] Fulltext extraction succeeded [{self._get_url_context(url)}]")
+            METRICS.incr("fallback_results", outcome="success", wait=wait_strategy)
+        else:
+            logging.info(f"[EMPTY] No extractable text in page [{self._get_url_context(url)}]")
+            METRICS.incr("fallback_results", outcome="empty", wait=wait_strategy)
+        return article
+
+class ParsePool():
+    """Extraction worker processes that are replaced if one of them dies.
+
+    A worker killed mid-parse (out of memory, a crash in lxml) breaks the
+    whole executor, so the first thread to notice swaps in a new one and
+    the page is parsed once more there. A page that breaks the new pool
+    too is given up on.
+    """
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        self._lock = threading.Lock()
+        self._pool = ProcessPoolExecutor(max_workers=processes)
+        for future in [self._pool.submit(int) for _ in range(processes)]:
+            future.result()
+
+    def extract(self, url: str, html: str) -> dict | None:
+        pool = self._pool
         try:
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=True)
-                try:
-                    page = browser.new_page()
-                    page.set_default_timeout(cfg.timeout)
-                    return self._fetch_page_content(page, url)
-                finally:
-                    browser.close()
-        except TimeoutError:
-            logging.warning(f"[TIMEOUT] Fulltext extraction timed out [{self._get_url_context(url)}]")
-            return self._retry_fulltext_with_backoff(url)
-        except Exception as e:
-            logging.warning(f"[{type(e).__name__}] Fulltext extraction failed [{self._get_url_context(url)}]: {e}")
+            return pool.submit(extract_article, url, html).result()
+        except BrokenProcessPool:
+            self._restart(pool)
+        try:
+            return self._pool.submit(extract_article, url, html).result()
+        except BrokenProcessPool:
+            self._restart(self._pool)
+            logging.error(f"Parse workers died twice on {url}, skipping it")
             return None
 
-    def _fetch_page_content(self, page, url, wait_strategy="networkidle"):
-        """Fetch page content with specified wait strategy."""
-        try:
-            logging.info(f"[FETCH] Loading {url} with {wait_strategy} strategy")
-            page.goto(url, timeout=cfg.timeout)
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        with self._lock:
+            self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
 
-            # Use appropriate wait strategy
-            if wait_strategy == "networkidle":
-                page.wait_for_load_state("networkidle", timeout=cfg.timeout)
-            else:
-                page.wait_for_load_state("domcontentloaded", timeout=cfg.timeout)
+    def _restart(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is not broken:
+                return
+            logging.warning("A parse worker died, restarting the parse pool")
+            METRICS.incr("parse_pool_restarts")
+            broken.shutdown(wait=False, cancel_futures=True)
+            # Forking from a download thread would copy locks other threads hold, spawned workers start clean
+            self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
 
-            html = page.content()
-            article = self._create_article(url, html)
-            if article:
-                logging.info(f"[SUCCESS] Fulltext extraction succeeded [{self._get_url_context(url)}]")
-            else:
-                logging.info(f"[EMPTY] No extractable text in page [{self._get_url_context(url)}]")
-            return article
-        except TimeoutError:
-            # Try to extract whatever loaded before timeout
-            try:
-                html = page.content()
-                logging.debug(f"[PARTIAL] Got partial content before timeout [{self._get_url_context(url)}]")
-                article = self._create_article(url, html)
+
+@contextlib.contextmanager
+def parse_pool(processes: int = None):
+    """Yield a pool of parse workers, or None when parsing stays in the I/O threads.
+
+    Every worker is started here, from the calling thread, instead of being
+    forked lazily from a download thread on the first parse.
+    """
+    processes = cfg.parse_processes if processes is None else processes
+    processes = processes or os.cpu_count() or 1
+    if processes <= 1:
+        yield None
+        return
+    pool = ParsePool(processes)
+    try:
+        yield pool
+    except BaseException:
+        # Aborting, queued parses are dropped rather than waited on
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+
+class BatchDownloader():
+    """Download many articles concurrently, yielding results as they complete.
+
+    Work is spread over thread_count workers, throttled per host by the
+    shared HostLimiter, and failed downloads are retried with exponential
+    backoff. The input is consumed lazily, so any iterable of URLs works.
+
+    The threads only do network I/O. Extraction is handed to a pool of
+    parse_processes workers, either the run's shared `parser` or one
+    started per download() call, each thread waiting on at most one parse, so
+    the queue between the two sides never exceeds thread_count pages.
+    Results are yielded as they complete and at most `in_flight` downloads
+    are outstanding, so memory stays flat however many URLs there are.
+    """
+
+    def __init__(self, browser: BrowserPool = None, limiter: HostLimiter = None,
+                 threads: int = None, retries: int = None, backoff: float = None,
+                 cache: PageCache = None, router: DomainRouter = None, processes: int = None,
+                 in_flight: int = None, parser: ParsePool = None):
+        self.browser = browser
+        self.cache = cache
+        self.router = router
+        self.limiter = limiter if limiter is not None else HostLimiter(cfg.per_host_limit, cfg.per_host_rate)
+        self.threads = threads or cfg.thread_count
+        # Downloads submitted but not yet consumed, which bounds memory as well as the queues
+        self.in_flight = in_flight or cfg.download_in_flight or self.threads * 2
+        self.retries = cfg.download_retries if retries is None else retries
+        self.backoff = cfg.download_backoff if backoff is None else backoff
+        # A pool shared by the whole run, otherwise one is started for each download() call
+        self.parser = parser
+        self.processes = processes
+        # URLs that still failed transiently after every retry, as opposed to having no article
+        self.transient = set()
+
+    def download(self, urls, total: int = None):
+        """Yield (url, data) pairs in completion order; data is None on failure."""
+        urls = iter(urls)
+        pending = {}
+        done_count = failed_count = 0
+        started = last_report = time.monotonic()
+
+        # The parse pool is entered first, so its workers exist before any I/O thread does
+        shared = contextlib.nullcontext(self.parser) if self.parser is not None else parse_pool(self.processes)
+        with shared as parser, ThreadPoolExecutor(max_workers=self.threads) as pool:
+            while True:
+                # Keep a bounded window of submitted work
+                while len(pending) < self.in_flight:
+                    url = next(urls, None)
+                    if url is None:
+                        break
+                    pending[pool.submit(self._download, url, parser)] = url
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    url = pending.pop(future)
+                    try:
+                        article = future.result()
+                    except Exception as e:
+                        logging.error(f"Unexpected error downloading {url}: {type(e).__name__}: {e}")
+                        METRICS.error(e, stage="download")
+                        article = None
+                    done_count += 1
+                    if not article:
+                        failed_count += 1
+                        logging.warning(f"Failed to download article from {url}")
+                        METRICS.incr("articles_failed")
+                    else:
+                        METRICS.incr("articles_fetched")
+                    yield url, article
+
+                now = time.monotonic()
+                if now - last_report >= 10 or not pending:
+                    last_report = now
+                    rate = done_count / max(now - started, 1e-9)
+                    progress = f"{done_count}/{total}" if total else f"{done_count}"
+                    logging.info(f"Downloaded {progress} articles ({failed_count} failed, {rate:.1f}/s)")
+
+    def _download(self, url: str, parser: ParsePool = None):
+        """Download one article, retrying only failures a retry may fix.
+
+        A page that loads but yields no article text is not retried, only
+        connection errors, timeouts and 429 or 5xx responses are.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = self.backoff * 2 ** (attempt - 1)
+                logging.debug(f"[RETRY {attempt}/{self.retries}] Retrying {url} in {delay:.1f}s")
+                time.sleep(delay)
+            downloader = ArticleDownloader(url, self.browser, self.cache, self.router, parser)
+            with self.limiter.slot(url), METRICS.timer("article_download"):
+                article = downloader.download()
+            if article or not downloader.transient:
                 return article
-            except:
-                raise
+        self.transient.add(url)
+        return None
 
-    def _retry_fulltext_with_backoff(self, url, attempt=1, max_attempts=None):
-        """Retry fulltext extraction with simpler strategies."""
-        if max_attempts is None:
-            max_attempts = cfg.playwright_retry_attempts
-        if attempt >= max_attempts:
-            logging.error(f"[EXHAUSTED] Max retry attempts ({max_attempts-1}) reached [{self._get_url_context(url)}]")
+class Typeset():
+    def __init__(self, index: ArchiveIndex = None, formats: list[str] = None):
+        self._index = index
+        self.formats = formats if formats is not None else cfg.formats
+
+    @property
+    def index(self) -> ArchiveIndex:
+        # Opened lazily so build workers never touch the database
+        if self._index is None:
+            self._index = ArchiveIndex(cfg.output_directory)
+        return self._index
+
+    @functools.cached_property
+    def duplicates(self) -> DuplicateIndex | None:
+        if not cfg.near_duplicate_distance:
             return None
+        return DuplicateIndex(self.index.path, cfg.near_duplicate_distance)
+
+    @functools.cached_property
+    def site(self) -> SiteIndex | None:
+        if not cfg.site_index:
+            return None
+        return SiteIndex(self.index.path, cfg.output_directory, self.render_template, cfg.listing_page_size, WRITER)
 
-        logging.debug(f"[RETRY {attempt}/{max_attempts-1}] Attempting simpler extraction strategy")
-        try:
-            with sync_playwright() as p:
-                browser = p.chromium.launch(headless=True)
-                try:
-                    page = browser.new_page()
-                    page.set_default_timeout(cfg.timeout * 2)
-                    # Use simpler wait strategy on retry
-                    return self._fetch_page_content(page, url, wait_strategy="domcontentloaded")
-                finally:
-                    browser.close()
-        except Exception as e:
-            logging.warning(f"[RETRY_FAILED {attempt}] {type(e).__name__}: {e}")
-            return self._retry_fulltext_with_backoff(url, attempt + 1, max_attempts)
-           
-class Typeset():
     def generator(self, articles):
-        if not articles:
+        """Write every article of an iterable as it arrives, then update the site index.
+
+        Articles may be parsed newspaper articles or their extracted data.
+        Nothing is collected, so a generator of downloads streams straight
+        to disk and each article's memory is released once it is written.
+        """
+        generated_count = total = 0
+        for a in articles:
+            total += 1
+            if self.add(a, total):
+                generated_count += 1
+
+        if not total:
             logging.warning("No articles to generate")
             return
-        
-        logging.info(f"Generating output for {len(articles)} articles")
-        generated_count = 0
+        logging.info(f"Successfully generated {generated_count}/{total} articles")
+        if self.site:
+            self.site.flush()
 
-        for idx, a in enumerate(articles, 1):
-            try:
-                if not a.title or not a.title.strip():
-                    logging.warning(f"Article {idx} missing title, skipping generation")
-                    continue
-                d = self._store_data(a)
-                generate = self.generators()
-                files = generate(d)
-                generated_count += 1
-                logging.debug(f"Generated output for article: {a.title[:50]}...")
-            except Exception as e:
-                logging.error(f"Error generating page for {a.url}: {type(e).__name__}: {e}", exc_info=True)
-        
-        logging.info(f"Successfully generated {generated_count}/{len(articles)} articles")
+    def add(self, a, idx: int = None) -> bool | None:
+        """Write one article, returning whether it was generated, or None if writing it failed."""
+        # Downloads arrive as extracted data, parsed articles are converted here
+        d = a if isinstance(a, dict) else self._store_data(a)
+        try:
+            if not d["title"].strip():
+                logging.warning(f"Article {idx or d['url']} missing title, skipping generation")
+                return False
+            if self._generate(d) is None:
+                return False
+            logging.debug(f"Generated output for article: {d['title'][:50]}...")
+            return True
+        except Exception as e:
+            logging.error(f"Error generating page for {d['url']}: {type(e).__name__}: {e}", exc_info=True)
+            METRICS.error(e, stage="typeset")
+            return None
+
+    def _slug(self, data: dict) -> str:
+        slug = _slugify(data.get("title") or "")
+        url = data.get("url")
+        if not url:
+            return slug
+        archived = self.index.get(url)
+        if archived:
+            return archived["slug"]
+        owner = self.index.slug_owner(slug)
+        if owner and owner != url:
+            logging.info(f"Slug '{slug}' belongs to {owner}, writing {url} under a distinct one")
+            slug = _collision_slug(slug, url)
+        return slug
+
+    @functools.cached_property
+    def _generate(self):
+        return self.generators()
 
     def _store_data(self, a) -> dict[str, str]:
         def _check(d):
@@ -356,85 +1160,280 @@ class Typeset():
             "author": a.authors,
             "date": a.publish_date.isoformat() if a.publish_date else "",
             "title": a.title or "",
-            "url": a.url or "",
+            "url": page_canonical(a.url, a.canonical_link) or "",
             "source": a.source_url or "",
             "summary": a.summary or "",
         }
         return data
         
-    def generators(self):
-        formats = cfg.formats
+    def generators(self, archive: bool = True):
+        formats = self.formats
         format_methods = {
-            "json": self.json,
-            "html": self.html,
+            "json": self.render_json,
+            "html": self.render_html,
         }
         
-        selected_methods = [format_methods[fmt] for fmt in formats if fmt in format_methods]
+        selected_methods = {fmt: format_methods[fmt] for fmt in formats if fmt in format_methods}
         
-        if not selected_methods:
+        if not selected_methods and not (archive and cfg.storage == "segments"):
             raise ValueError("No valid output formats specified.")
         
         def generate_files(data):
-            for method in selected_methods:
-                method(data)
+            # Near duplicates of archived articles are caught before anything is rendered
+            fingerprint = simhash(data.get("text")) if archive and self.duplicates else None
+            if fingerprint is not None:
+                original = self.duplicates.find(fingerprint, exclude=data.get("url"))
+                if original:
+                    logging.info(f"Skipping near duplicate of {original}: {data.get('url')}")
+                    METRICS.incr("articles_skipped", reason="near_duplicate")
+                    self.index.add_alias(data.get("url"), original)
+                    return None
+            contents = {fmt: method(data) for fmt, method in selected_methods.items()}
+            slug = self._create_files(contents, data, archive=archive)
+            if fingerprint is not None:
+                self.duplicates.add(data.get("url"), fingerprint)
+            return slug
         
         return generate_files
         
-    def json(self, data):
-        content = json.dumps(data, indent=4)
-        title = data["title"]
-        self._create_file(content, title, format="json")
+    def render_json(self, data) -> str:
+        with METRICS.timer("render", format="json"):
+            return json.dumps(data, indent=4)
         
-    def html(self, data):
+    def render_html(self, data) -> str:
+        # Article pages sit one directory below the site root
+        return self.render_template("article.html", {**data, "root": "../"})
+
+    def render_template(self, name: str, data) -> str:
         try:
             if not Path(cfg.template_directory).exists():
                 logging.error(f"Template directory does not exist: {cfg.template_directory}")
                 raise FileNotFoundError(f"Template directory not found: {cfg.template_directory}")
 
-            loader = FileSystemLoader(cfg.template_directory)
-            env = Environment(loader=loader)
+            env = template_environment(cfg.template_directory)
             
             try:
-                template = env.get_template("article.html")
+                template = env.get_template(name)
             except Exception as e:
-                logging.error(f"Template 'article.html' not found in {cfg.template_directory}: {e}")
+                logging.error(f"Template '{name}' not found in {cfg.template_directory}: {e}")
                 raise
             
-            html = template.render(data)
-            title = data.get("title")
-            return self._create_file(html, title, format="html")
+            with METRICS.timer("render", format="html"):
+                html = template.render(data)
+                return minify_html(html) if cfg.minify_html else html
         except Exception as e:
             logging.error(f"Error rendering HTML template: {type(e).__name__}: {e}", exc_info=True)
             raise
     
-    def _create_file(self, content: str, title:str, format: str):
-        def _slugify(text: str) -> str:
-            text = unicodedata.normalize("NFKD", text)
-            text = text.encode("ascii", "ignore").decode("ascii")
-            text = re.sub(r"[^\w\s-]", "", text).strip().lower()
-            slug = re.sub(r"[-\s]+", "_", text)
-            return slug or "article"
-        
-        if not content or not content.strip():
-            logging.error(f"Cannot save file for '{title}': content is empty")
-            raise ValueError("File content cannot be empty")
-        
-        filename = _slugify(title) + "." + format
-        format_path = Path.joinpath(Path(cfg.output_directory), format)
-        format_path.mkdir(exist_ok=True)
-        file_path = Path.joinpath(format_path, filename)
+    def _create_file(self, content: str, data: dict, format: str, record: bool = True, slug: str = None) -> str:
+        return self._create_files({format: content}, data, record=record, archive=False, slug=slug)
+
+    def _create_files(self, contents: dict[str, str], data: dict, record: bool = True, archive: bool = True,
+                      slug: str = None) -> str:
+        """Write every rendered format of one article, skipping files that are unchanged.
+
+        With segment storage the article data is also appended to the store,
+        unless `archive` is unset (builds and exports of already stored data).
+        Unless given, the slug comes from the title; an article keeps the slug
+        it was first written under and never takes one another article owns.
+        """
+        title = data.get("title") or ""
+        for format, content in contents.items():
+            if not content or not content.strip():
+                logging.error(f"Cannot save file for '{title}': content is empty")
+                raise ValueError("File content cannot be empty")
         
-        if file_path.exists():
-            logging.info(f"File already exists, overwriting: {filename}")
+        if slug is None:
+            slug = self._slug(data) if record else _slugify(title)
+        stored = archive and record and cfg.storage == "segments"
+        if stored:
+            with METRICS.timer("write", format="segments"):
+                segment_store().append(data)
+            METRICS.incr("records_appended")
+
+        files = {}
+        for format, content in contents.items():
+            file_path = Path.joinpath(Path(cfg.output_directory), format, slug + "." + format)
+            files[file_path] = content.encode("utf-8")
         
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(content)
-            
-            if file_path.stat().st_size == 0:
-                logging.warning(f"File saved but is empty: {filename}")
-            
-            logging.info(f"Saved article [{format}]: {filename} ({file_path.stat().st_size} bytes)")
+            with METRICS.timer("write"):
+                written = WRITER.write_many(files)
         except IOError as e:
-            logging.error(f"Failed to write file {file_path}: {type(e).__name__}: {e}", exc_info=True)
-            raise
\ No newline at end of file
+            logging.error(f"Failed to write files for '{title}': {type(e).__name__}: {e}", exc_info=True)
+            METRICS.error(e, stage="write")
+            raise
+
+        for (file_path, content), format in zip(files.items(), contents):
+            if written[file_path]:
+                logging.info(f"Saved article [{format}]: {file_path.name} ({len(content)} bytes)")
+                METRICS.incr("files_written", format=format)
+                METRICS.incr("bytes_written", len(content), format=format)
+            else:
+                logging.debug(f"Article unchanged, skipped write [{format}]: {file_path.name}")
+                METRICS.incr("files_unchanged", format=format)
+
+        if record:
+            digest = content_digest(data)
+            formats = [*contents, "segments"] if stored else list(contents)
+            self.index.record_many((data.get("url"), slug, format, digest) for format in formats)
+            if "html" in contents and self.site:
+                self.site.add(data, slug)
+        return slug
+
+
+def extract_article(url: str, html: str) -> dict | None:
+    """Parse a fetched page into article data. Runs in parse worker processes."""
+    article = ArticleDownloader(url)._create_article(url, html)
+    return Typeset()._store_data(article) if article else None
+
+
+def _is_transient(error: BaseException) -> bool:
+    """Whether a failed fetch is worth retrying: connection errors, timeouts, 429 and 5xx."""
+    seen = error
+    while seen is not None:
+        if isinstance(seen, (TimeoutError, ConnectionError)):
+            return True
+        status = getattr(getattr(seen, "response", None), "status_code", None)
+        if status is not None:
+            return status == 429 or status >= 500
+        # requests and Playwright exceptions don't derive from the builtins above
+        if type(seen).__name__ in ("ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout", "TimeoutError"):
+            return True
+        seen = seen.__cause__ or seen.__context__
+    # newspaper reports failed downloads as a message only
+    return bool(TRANSIENT_MESSAGE.search(str(error)))
+
+
+def default_strategies() -> list[str]:
+    """Extraction strategies in the order tried for domains without a learned route."""
+    strategies = ["newspaper", cfg.playwright_wait_strategy]
+    if cfg.playwright_retry_attempts > 1 and cfg.playwright_wait_strategy != "domcontentloaded":
+        strategies.append("domcontentloaded")
+    return strategies
+
+
+def _slugify(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    text = text.encode("ascii", "ignore").decode("ascii")
+    text = re.sub(r"[^\w\s-]", "", text).strip().lower()
+    slug = re.sub(r"[-\s]+", "_", text)
+    return slug or "article"
+
+
+def _collision_slug(slug: str, url: str) -> str:
+    return f"{slug}_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}"
+
+
+@functools.cache
+def segment_store() -> SegmentStore:
+    """The process-wide segment store, opened once so appends share one active segment."""
+    return SegmentStore(
+        Path.joinpath(Path(cfg.output_directory), "segments"),
+        compression=cfg.segment_compression,
+        segment_size=cfg.segment_size * 2**20,
+    )
+
+
+@functools.cache
+def site_assets() -> AssetStore:
+    """The site's vendored assets. Only the 'vendor' command fetches, rendering never does."""
+    assets = AssetStore(Path.joinpath(Path(cfg.output_directory), "assets"), WRITER)
+    missing = [url for url in template_assets(cfg.template_directory) if url not in assets.manifest]
+    if cfg.vendor_assets and missing:
+        logging.warning(f"{len(missing)} template asset(s) are not vendored, pages link to them directly until 'vendor' is run")
+    return assets
+
+
+@functools.lru_cache(maxsize=None)
+def template_environment(template_directory: Path) -> jinja2.Environment:
+    """Shared Jinja environment, compiled templates are cached on disk between runs."""
+    cache_path = Path.joinpath(PROJECT_ROOT, ".cache", "templates")
+    cache_path.mkdir(parents=True, exist_ok=True)
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(template_directory),
+        bytecode_cache=jinja2.FileSystemBytecodeCache(str(cache_path)),
+    )
+
+    @jinja2.pass_context
+    def asset(context, url: str) -> str:
+        return site_assets().href(url, context.get("root", "")) if cfg.vendor_assets else url
+
+    env.globals["asset"] = asset
+    return env
+
+
+def template_digest(template_directory: Path) -> str:
+    """Hash of every file in the template directory and the output options, used to invalidate builds."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(template_directory).rglob("*")):
+        if path.is_file():
+            digest.update(str(path.relative_to(template_directory)).encode("utf-8"))
+            digest.update(path.read_bytes())
+    # Pages change with these as well, and re-rendering writes any missing compressed siblings
+    assets = site_assets().manifest if cfg.vendor_assets else {}
+    digest.update(json.dumps([cfg.minify_html, cfg.precompress, assets], sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _build_article(item):
+    """Render one JSON file to HTML. Runs in build worker processes."""
+    path, known_hash = item
+    path = Path(path)
+    try:
+        raw = path.read_bytes()
+        st = path.stat()
+        content_hash = hashlib.sha256(raw).hexdigest()
+        result = {
+            "name": path.name,
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "content_hash": content_hash,
+            "rendered": False,
+        }
+        if content_hash == known_hash:
+            return result
+
+        return _render_article(json.loads(raw), result, path.stem)
+    except Exception as e:
+        logging.error(f"Failed to build {path.name}: {type(e).__name__}: {e}")
+        return None
+
+
+def _build_record(item):
+    """Render one article read from a segment. Runs in build worker processes."""
+    name, content_hash, data, slug = item
+    try:
+        result = {
+            "name": name,
+            "mtime_ns": 0,
+            "size": 0,
+            "content_hash": content_hash,
+            "rendered": False,
+        }
+        return _render_article(data, result, slug)
+    except Exception as e:
+        logging.error(f"Failed to build {name}: {type(e).__name__}: {e}")
+        return None
+
+
+def _render_article(data: dict, result: dict, slug: str) -> dict:
+    typeset = Typeset()
+    slug = typeset._create_file(typeset.render_html(data), data, format="html", record=False, slug=slug)
+    listing = {k: data.get(k) for k in ("title", "date", "author", "url", "source")}
+    result.update(rendered=True, url=data.get("url"), slug=slug, digest=content_digest(data), listing=listing)
+    return result
+
+
+def _reparse_page(item):
+    """Extract one article from its cached pages. Runs in reparse worker processes."""
+    url, paths = item
+    for path in paths:
+        try:
+            html = gzip.decompress(Path(path).read_bytes()).decode("utf-8")
+            article = ArticleDownloader(url)._create_article(url, html)
+            if article:
+                return Typeset()._store_data(article)
+        except Exception as e:
+            logging.error(f"Failed to reparse {url} from {Path(path).name}: {type(e).__name__}: {e}")
+    return None
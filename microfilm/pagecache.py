@@ -0,0 +1,135 @@
+# Module imports
+import gzip
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from writer import FileWriter
+
+
+class PageCache():
+    """Compressed, content-addressed store of fetched pages.
+
+    Raw HTTP responses and Playwright-rendered DOMs are kept as gzipped
+    blobs named by the sha256 of their content, so identical pages are
+    stored once. The pages table in the archive database maps each
+    (url, fetch time, kind) to a blob. Pages of archived articles, including
+    those fetched under a URL that is an alias of one, are kept
+    indefinitely; everything else is evicted least recently used first
+    once it exceeds `max_bytes`.
+    """
+
+    KINDS = ("raw", "rendered")
+    # Puts between eviction checks
+    EVICT_INTERVAL = 100
+
+    def __init__(self, database: Path, directory: Path, max_bytes: int = 1024 * 2**20):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.writer = FileWriter()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._db = sqlite3.connect(database, check_same_thread=False, timeout=30)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (url, fetched_at, kind)
+            );
+            CREATE INDEX IF NOT EXISTS pages_digest ON pages (digest);
+            CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used);
+            """
+        )
+        self._db.commit()
+
+    def put(self, url: str, html: str, kind: str = "raw"):
+        """Store a fetched page. Failures are logged, never raised into the download."""
+        if not html or kind not in self.KINDS:
+            return
+        try:
+            data = html.encode("utf-8")
+            digest = hashlib.sha256(data).hexdigest()
+            path = self.path(digest)
+            if not path.exists():
+                self.writer.write(path, gzip.compress(data, compresslevel=6, mtime=0))
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO pages (url, fetched_at, kind, digest, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, datetime.now(timezone.utc).isoformat(), kind, digest, path.stat().st_size, time.time()),
+                )
+                self._db.commit()
+                self._puts += 1
+                evict = self._puts % self.EVICT_INTERVAL == 0
+            if evict:
+                self.evict()
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"Could not cache page {url}: {type(e).__name__}: {e}")
+
+    def archived(self):
+        """Yield (url, {kind: digest}) with the newest page of each kind for every archived or aliased URL."""
+        with self._lock:
+            rows = self._db.execute(
+                """
+                SELECT url, kind, digest FROM pages
+                WHERE url IN (SELECT url FROM articles) OR url IN (SELECT url FROM aliases)
+                ORDER BY url, fetched_at DESC
+                """
+            ).fetchall()
+        current, pages = None, {}
+        for url, kind, digest in rows:
+            if url != current:
+                if current is not None:
+                    yield current, pages
+                current, pages = url, {}
+            pages.setdefault(kind, digest)
+        if current is not None:
+            yield current, pages
+
+    def evict(self) -> int:
+        """Drop least recently used pages of unarchived URLs until under max_bytes."""
+        with self._lock:
+            rows = self._db.execute(
+                """
+                SELECT url, fetched_at, kind, digest, size FROM pages
+                WHERE url NOT IN (SELECT url FROM articles) AND url NOT IN (SELECT url FROM aliases)
+                ORDER BY last_used
+                """
+            ).fetchall()
+            excess = sum(row[4] for row in rows) - self.max_bytes
+            evicted = []
+            for url, fetched_at, kind, digest, size in rows:
+                if excess <= 0:
+                    break
+                self._db.execute(
+                    "DELETE FROM pages WHERE url = ? AND fetched_at = ? AND kind = ?", (url, fetched_at, kind)
+                )
+                evicted.append(digest)
+                excess -= size
+            orphaned = [
+                digest for digest in set(evicted)
+                if not self._db.execute("SELECT 1 FROM pages WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+            ]
+            self._db.commit()
+
+        for digest in orphaned:
+            self.path(digest).unlink(missing_ok=True)
+        if evicted:
+            logging.debug(f"Evicted {len(evicted)} cached pages ({len(orphaned)} blobs)")
+        return len(evicted)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def path(self, digest: str) -> Path:
+        return Path.joinpath(self.directory, digest[:2], digest[2:] + ".html.gz")
@@ -0,0 +1,106 @@
+# Module imports
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlparse
+
+
+class DomainRouter():
+    """Learns which extraction strategy works for each domain.
+
+    Every attempt is recorded per (domain, strategy) with its outcome and
+    duration, persisted in the archive database. Once a domain has enough
+    samples, URLs on it go straight to the strategy with the best success
+    rate, the faster one winning between similar rates, and only fall back
+    to the others if it fails. Every `probe_interval`-th routed URL on a
+    domain uses the default order again, so a site that stops needing the
+    browser is noticed.
+    """
+
+    MIN_SAMPLES = 3
+
+    def __init__(self, database: Path, strategies: list[str], probe_interval: int = 20):
+        self.strategies = list(strategies)
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._routed = {}
+        self._db = sqlite3.connect(database, check_same_thread=False, timeout=30)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS domain_strategies (
+                domain TEXT NOT NULL,
+                strategy TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                successes INTEGER NOT NULL,
+                seconds REAL NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (domain, strategy)
+            ) WITHOUT ROWID
+            """
+        )
+        self._db.commit()
+        self._stats = {
+            (domain, strategy): [attempts, successes, seconds]
+            for domain, strategy, attempts, successes, seconds in self._db.execute(
+                "SELECT domain, strategy, attempts, successes, seconds FROM domain_strategies"
+            )
+        }
+
+    def plan(self, url: str) -> list[str]:
+        """Strategies to try for a URL, in order."""
+        domain = _domain(url)
+        best = self.best(domain)
+        if best is None or best == self.strategies[0]:
+            return list(self.strategies)
+        with self._lock:
+            routed = self._routed[domain] = self._routed.get(domain, 0) + 1
+        if self.probe_interval and routed % self.probe_interval == 0:
+            logging.debug(f"Re-probing {domain} with the default strategy order")
+            return list(self.strategies)
+        return [best] + [s for s in self.strategies if s != best]
+
+    def best(self, domain: str) -> str | None:
+        with self._lock:
+            candidates = []
+            for strategy in self.strategies:
+                attempts, successes, seconds = self._stats.get((domain, strategy), (0, 0, 0.0))
+                if attempts < self.MIN_SAMPLES:
+                    continue
+                # Smoothed so a handful of samples can't claim a perfect record
+                rate = (successes + 1) / (attempts + 2)
+                candidates.append((round(rate, 1), -seconds / attempts, strategy))
+        if not candidates:
+            return None
+        return max(candidates)[2]
+
+    def record(self, url: str, strategy: str, success: bool, seconds: float):
+        domain = _domain(url)
+        with self._lock:
+            stats = self._stats.setdefault((domain, strategy), [0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += int(success)
+            stats[2] += seconds
+            self._db.execute(
+                """
+                INSERT INTO domain_strategies (domain, strategy, attempts, successes, seconds, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(domain, strategy) DO UPDATE SET
+                    attempts = excluded.attempts,
+                    successes = excluded.successes,
+                    seconds = excluded.seconds,
+                    updated_at = excluded.updated_at
+                """,
+                (domain, strategy, *stats, datetime.now(timezone.utc).isoformat()),
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _domain(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
@@ -0,0 +1,201 @@
+# Module imports
+import calendar
+import logging
+import random
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Seconds per sy:updatePeriod
+UPDATE_PERIODS = {
+    "hourly": 3600,
+    "daily": 86400,
+    "weekly": 604800,
+    "monthly": 2592000,
+    "yearly": 31536000,
+}
+
+# Statuses that mean the publisher wants us to slow down
+THROTTLED = {429, 503}
+
+
+@dataclass
+class Poll:
+    """What one fetch of a feed says about when to fetch it next."""
+    status: int | None = None
+    error: bool = False
+    new_entries: int = 0
+    # Minimum interval the publisher asks for through ttl, sy:updatePeriod or Cache-Control
+    min_interval: float | None = None
+    retry_after: float | None = None
+    published: list[float] = field(default_factory=list)
+
+
+@dataclass
+class FeedSchedule:
+    """Polling state of one feed.
+
+    The base interval is half the feed's observed publishing cadence, or
+    update_frequency until there is one. Each poll without new entries
+    stretches it by half again, publisher hints set a floor and failures
+    back off exponentially, honoring Retry-After.
+    """
+    url: str
+    interval: float
+    next_due: float = 0.0
+    cadence: float | None = None
+    quiet: int = 0
+    failures: int = 0
+    running: bool = False
+
+    def update(self, poll: Poll | None, default: float, minimum: float, maximum: float, jitter: float = 0.1):
+        now = time.monotonic()
+        if poll is None or poll.error or poll.status in THROTTLED or (poll.status or 0) >= 500:
+            self.failures += 1
+            delay = min(maximum, max(self.interval, minimum) * 2 ** self.failures)
+            if poll is not None and poll.retry_after:
+                delay = max(delay, poll.retry_after)
+            logging.info(f"Backing off {self.url} for {delay:.0f}s after {self.failures} failed poll(s)")
+            self.next_due = now + delay
+            return
+
+        self.failures = 0
+        self.cadence = _cadence(poll.published) or self.cadence
+        self.quiet = 0 if poll.new_entries else self.quiet + 1
+        base = self.cadence / 2 if self.cadence else default
+        interval = min(maximum, max(minimum, base * 1.5 ** min(self.quiet, 8)))
+        self.interval = max(interval, poll.min_interval or 0, poll.retry_after or 0)
+        self.next_due = now + self.interval * random.uniform(1 - jitter, 1 + jitter)
+        logging.debug(f"Next poll of {self.url} in {self.next_due - now:.0f}s")
+
+
+class Scheduler():
+    """Polls each feed when it is due, never running the same feed twice at once.
+
+    Each due feed is handed to `run` on its own, earliest due first, with
+    up to `concurrency` feeds in flight, so a slow publisher only holds up
+    itself. `run` returns a Poll per feed URL. Once `stop` is set no new
+    runs start and in-flight ones are drained; a KeyboardInterrupt
+    abandons them instead.
+    """
+
+    def __init__(self, urls: list[str], run, default: float, minimum: float, maximum: float, concurrency: int = 2):
+        self.run_feeds = run
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.concurrency = max(1, concurrency)
+        self.schedules = {url: FeedSchedule(url, default) for url in urls}
+
+    def run(self, stop: threading.Event):
+        running = {}
+        pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            while not stop.is_set():
+                now = time.monotonic()
+                due = sorted(
+                    (s for s in self.schedules.values() if not s.running and s.next_due <= now),
+                    key=lambda s: s.next_due,
+                )
+                if due and len(running) < self.concurrency:
+                    for schedule in due[:self.concurrency - len(running)]:
+                        schedule.running = True
+                        logging.info(f"Polling {schedule.url}")
+                        running[pool.submit(self.run_feeds, [schedule.url])] = schedule
+                    continue
+
+                # Wake at least every second so a stop request is seen promptly
+                idle = [s.next_due for s in self.schedules.values() if not s.running]
+                timeout = min(1.0, max(0.1, min(idle) - now)) if idle else 1.0
+                if running:
+                    done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._finish(future, running.pop(future))
+                else:
+                    stop.wait(timeout)
+
+            if running:
+                logging.info(f"Waiting for {len(running)} in-flight feed run(s) to finish")
+            for future in list(running):
+                self._finish(future, running.pop(future))
+        except KeyboardInterrupt:
+            # A second interrupt abandons in-flight runs instead of joining them
+            logging.info(f"Abandoning {len(running)} in-flight feed run(s)")
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+
+    def _finish(self, future, schedule: FeedSchedule):
+        try:
+            polls = future.result()
+        except Exception as e:
+            logging.error(f"Feed run for {schedule.url} failed: {type(e).__name__}: {e}", exc_info=True)
+            polls = {}
+        schedule.running = False
+        schedule.update(polls.get(schedule.url), self.default, self.minimum, self.maximum)
+
+
+def read_poll(feed, new_entries: int = 0) -> Poll:
+    """Collect the scheduling hints of a parsed feed response."""
+    headers = feed.get("headers") or {}
+    channel = feed.get("feed", {})
+    status = feed.get("status")
+
+    hints = []
+    ttl = _number(channel.get("ttl"))
+    if ttl:
+        hints.append(ttl * 60)
+    period = UPDATE_PERIODS.get(str(channel.get("sy_updateperiod", "")).strip().lower())
+    if period:
+        hints.append(period / max(1, _number(channel.get("sy_updatefrequency")) or 1))
+    max_age = re.search(r"max-age=(\d+)", headers.get("cache-control", ""))
+    if max_age:
+        hints.append(float(max_age.group(1)))
+
+    published = []
+    for entry in feed.get("entries", []):
+        parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+        if parsed:
+            published.append(float(calendar.timegm(parsed)))
+
+    return Poll(
+        status=status,
+        error=status is None or bool(feed.get("bozo") and not feed.get("entries") and status != 304),
+        new_entries=new_entries,
+        min_interval=max(hints) if hints else None,
+        retry_after=_retry_after(headers.get("retry-after")),
+        published=published,
+    )
+
+
+def _cadence(published: list[float]) -> float | None:
+    """Median gap between the most recent entries, None with fewer than three."""
+    recent = sorted(set(published), reverse=True)[:20]
+    gaps = [a - b for a, b in zip(recent, recent[1:]) if a > b]
+    if len(gaps) < 2:
+        return None
+    return statistics.median(gaps)
+
+
+def _retry_after(value) -> float | None:
+    if not value:
+        return None
+    seconds = _number(value)
+    if seconds is not None:
+        return max(0.0, seconds)
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _number(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
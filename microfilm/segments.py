@@ -0,0 +1,285 @@
+# Module imports
+import bisect
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where the store is not guarded against other processes
+    fcntl = None
+
+# sha1(url), segment number, offset, length
+RECORD = struct.Struct("<20sIQI")
+SCAN_CHUNK = 1 << 16
+# Segment file suffix for each compression
+SUFFIXES = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+
+class SegmentStore():
+    """Append-only archive of articles in compressed JSONL segment files.
+
+    Every record is its own gzip member (or zstd frame), so a segment is an
+    ordinary .jsonl.gz/.jsonl.zst file for full scans and a single record can
+    be read by seeking to its offset. Once a segment reaches `segment_size`
+    it is sealed and its offsets are written, sorted by URL hash, to a
+    fixed-width .idx file that lookups binary-search through mmap. The open
+    segment's offsets are journalled to .idx.journal as records are added.
+
+    Segments are numbered across both compressions and each is read with
+    the codec its suffix names, so changing `compression` only affects
+    new segments. An open segment of the other codec is sealed on startup.
+
+    Offsets are only tracked in memory by the process that wrote them, so
+    a store holds an exclusive lock on its directory until close(), and
+    opening it from a second process raises instead of interleaving
+    appends.
+    """
+
+    def __init__(self, directory: Path, compression: str = "gzip", segment_size: int = 64 * 2**20):
+        if compression == "zstd" and zstandard is None:
+            logging.warning("zstandard is not installed, falling back to gzip segments")
+            compression = "gzip"
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compression = compression
+        self.segment_size = segment_size
+        self._lock = threading.Lock()
+        self._sealed = {}
+        self._active = {}
+        self._lock_file = self._acquire()
+        try:
+            self._open()
+        except BaseException:
+            self._lock_file.close()
+            raise
+
+    def __iter__(self):
+        """Stream every live record, oldest segment first."""
+        for number, path in sorted(self._paths.items()):
+            for offset, length, data in self._scan(path):
+                key = _key(data.get("url") or data.get("title") or "")
+                if self._locate(key) == (number, offset, length):
+                    yield data
+
+    def append(self, data: dict):
+        """Append an article; a newer record for the same URL replaces the old one."""
+        key = _key(data.get("url") or data.get("title") or "")
+        payload = self._compress(json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n")
+        with self._lock:
+            if self._file.tell() and self._file.tell() + len(payload) > self.segment_size:
+                self._seal()
+            offset = self._file.tell()
+            self._file.write(payload)
+            self._file.flush()
+            self._journal.write(RECORD.pack(key, self._number, offset, len(payload)))
+            self._journal.flush()
+            self._active[key] = (self._number, offset, len(payload))
+
+    def get(self, url: str) -> dict | None:
+        location = self._locate(_key(url))
+        if location is None:
+            return None
+        number, offset, length = location
+        path = self._paths[number]
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return json.loads(_decompress(f.read(length), _codec(path)))
+
+    def __contains__(self, url: str) -> bool:
+        return self._locate(_key(url)) is not None
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._journal.close()
+            for f, index in self._sealed.values():
+                index.close()
+                f.close()
+            self._sealed = {}
+            # Closing the file releases the lock
+            self._lock_file.close()
+
+    def _acquire(self):
+        lock_file = open(Path.joinpath(self.directory, ".lock"), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                raise RuntimeError(f"{self.directory} is in use by another microfilm process") from None
+        return lock_file
+
+    def _open(self):
+        self._paths = dict(self._segments())
+        if zstandard is None and any(_codec(path) == "zstd" for path in self._paths.values()):
+            raise ImportError(f"zstandard is not installed, but {self.directory} has zstd segments")
+        self._number = 1
+        for number, path in sorted(self._paths.items()):
+            index_path = _index_path(path)
+            if index_path.exists():
+                self._load_sealed(number, index_path)
+                self._number = number + 1
+            else:
+                # An unsealed segment is the one still being appended to
+                self._number = number
+
+        path = self._paths.get(self._number)
+        if path is not None:
+            journal_path = _journal_path(path)
+            if journal_path.exists():
+                raw = journal_path.read_bytes()
+                for i in range(0, len(raw) - len(raw) % RECORD.size, RECORD.size):
+                    key, number, offset, length = RECORD.unpack_from(raw, i)
+                    self._active[key] = (number, offset, length)
+            if _codec(path) != self.compression:
+                # Appending with another codec would mix formats in one file
+                self._write_index()
+        self._start()
+
+    def _seal(self):
+        """Close the active segment and write its sorted offset index."""
+        self._file.close()
+        self._journal.close()
+        self._write_index()
+        self._start()
+
+    def _write_index(self):
+        path = self._paths[self._number]
+        index_path = _index_path(path)
+        records = b"".join(RECORD.pack(key, *location) for key, location in sorted(self._active.items()))
+        tmp = index_path.with_suffix(".idx.tmp")
+        tmp.write_bytes(records)
+        os.replace(tmp, index_path)
+        _journal_path(path).unlink(missing_ok=True)
+        if records:
+            self._load_sealed(self._number, index_path)
+        logging.debug(f"Sealed archive segment {path.name} ({len(self._active)} records)")
+        self._number += 1
+        self._active = {}
+
+    def _start(self):
+        path = self._paths[self._number] = Path.joinpath(
+            self.directory, f"segment-{self._number:06d}{SUFFIXES[self.compression]}"
+        )
+        self._file = open(path, "ab")
+        self._journal = open(_journal_path(path), "ab")
+
+    def _load_sealed(self, number, index_path):
+        if index_path.stat().st_size == 0:
+            return
+        f = open(index_path, "rb")
+        self._sealed[number] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _locate(self, key: bytes):
+        location = self._active.get(key)
+        if location is not None:
+            return location
+        # Newest sealed segment wins
+        for number in sorted(self._sealed, reverse=True):
+            index = self._sealed[number][1]
+            count = len(index) // RECORD.size
+            keys = _IndexKeys(index, count)
+            i = bisect.bisect_left(keys, key)
+            if i < count and keys[i] == key:
+                _, number, offset, length = RECORD.unpack_from(index, i * RECORD.size)
+                return (number, offset, length)
+        return None
+
+    def _scan(self, path: Path):
+        """Yield (offset, length, record) for each compressed member in a segment."""
+        if not path.stat().st_size:
+            return
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as raw:
+            offset = 0
+            while offset < len(raw):
+                decompressor = _decompressor(_codec(path))
+                chunks = []
+                position = offset
+                while not decompressor.eof and position < len(raw):
+                    chunks.append(decompressor.decompress(raw[position:position + SCAN_CHUNK]))
+                    position += SCAN_CHUNK
+                if not decompressor.eof:
+                    logging.warning(f"Truncated record at {path.name}:{offset}, ignoring the rest of the segment")
+                    return
+                length = min(position, len(raw)) - offset - len(decompressor.unused_data)
+                yield offset, length, json.loads(b"".join(chunks))
+                offset += length
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(write_content_size=True).compress(data)
+        return gzip.compress(data, compresslevel=6, mtime=0)
+
+    def _segments(self) -> list[tuple[int, Path]]:
+        """Segments of every compression; if a number was written twice, the newer file wins."""
+        segments = {}
+        for suffix in SUFFIXES.values():
+            for path in self.directory.glob(f"segment-*{suffix}"):
+                try:
+                    number = int(path.name[len("segment-"):-len(suffix)])
+                except ValueError:
+                    continue
+                if number in segments:
+                    logging.warning(f"Archive segment {number} exists for two codecs, ignoring the older file")
+                    if segments[number].stat().st_mtime > path.stat().st_mtime:
+                        continue
+                segments[number] = path
+        return sorted(segments.items())
+
+
+class _IndexKeys():
+    """Sequence view of the URL hashes in an mmapped index, for bisect."""
+
+    def __init__(self, index, count):
+        self.index = index
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = i * RECORD.size
+        return self.index[start:start + 20]
+
+
+def _codec(path: Path) -> str:
+    return "zstd" if path.name.endswith(SUFFIXES["zstd"]) else "gzip"
+
+
+def _index_path(path: Path) -> Path:
+    # Named after the segment file, so segments of different codecs never share an index
+    return path.with_name(f"{path.name}.idx")
+
+
+def _journal_path(path: Path) -> Path:
+    return path.with_name(f"{path.name}.idx.journal")
+
+
+def _decompressor(codec: str):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _key(url: str) -> bytes:
+    return hashlib.sha1(url.encode("utf-8")).digest()
@@ -0,0 +1,315 @@
+# Module imports
+import json
+import logging
+import re
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from urllib.parse import urlparse
+
+from writer import FileWriter
+
+# Listing kinds and the label shown for each on the site
+KINDS = {
+    "date": "By date",
+    "author": "By author",
+    "source": "By source",
+}
+
+# Single characters and very common words aren't worth indexing
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "he", "in",
+    "is", "it", "its", "of", "on", "or", "that", "the", "to", "was", "were", "will", "with",
+}
+
+
+class SiteIndex():
+    """Listing pages and client-side search shards, maintained incrementally.
+
+    Articles are grouped into listings (by month, author and source) and
+    paginated in the order they were archived, so adding an article only
+    touches the last page of each of its listings, the listing directories
+    and the search shards for its terms. Only the last page shows the page
+    count, so earlier pages never go stale. Changes are collected until
+    flush() writes the affected files.
+
+    Search shards live under search/: terms/<prefix>.json maps each term to
+    article ids, docs/<n>.json maps ids to title, link and date.
+    """
+
+    TERM_PREFIX = 2
+    DOC_SHARD_SIZE = 1000
+
+    def __init__(self, database: Path, output_directory: Path, render, page_size: int = 50,
+                 writer: FileWriter = None):
+        self.output_directory = Path(output_directory)
+        self.render = render
+        self.page_size = page_size
+        self.writer = writer or FileWriter()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(database, check_same_thread=False, timeout=30)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS listing_articles (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                slug TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL,
+                date TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS listing_members (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                label TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                PRIMARY KEY (kind, key, id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS listing_members_id ON listing_members (id);
+            CREATE TABLE IF NOT EXISTS search_terms (
+                term TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                PRIMARY KEY (term, id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS search_terms_id ON search_terms (id);
+            """
+        )
+        self._db.commit()
+        self._dirty_pages = set()
+        self._dirty_kinds = set()
+        self._dirty_prefixes = set()
+        self._dirty_docs = set()
+
+    def add(self, data: dict, slug: str):
+        """Add or update an article; affected files are written on flush()."""
+        title = data.get("title") or slug
+        date = data.get("date") or ""
+        memberships = self._memberships(data)
+        terms = _terms(" ".join([title] + list(data.get("author") or [])))
+
+        with self._lock:
+            row = self._db.execute("SELECT id FROM listing_articles WHERE slug = ?", (slug,)).fetchone()
+            if row:
+                article_id = row[0]
+                self._db.execute("UPDATE listing_articles SET title = ?, date = ? WHERE id = ?", (title, date, article_id))
+                old = self._db.execute(
+                    "SELECT kind, key, label FROM listing_members WHERE id = ?", (article_id,)
+                ).fetchall()
+                for kind, key, label in set(old) - set(memberships):
+                    # Later pages of that listing shift back by one
+                    page = self._page_of(kind, key, article_id)
+                    count = self._count(kind, key)
+                    self._db.execute(
+                        "DELETE FROM listing_members WHERE kind = ? AND key = ? AND id = ?", (kind, key, article_id)
+                    )
+                    # If the last page empties, the one before becomes last and loses its "next" link
+                    first = min(page, self._pages(count - 1))
+                    for p in range(first, self._pages(count) + 1):
+                        self._dirty_pages.add((kind, key, p))
+                    self._dirty_kinds.add(kind)
+                old_terms = [t for (t,) in self._db.execute("SELECT term FROM search_terms WHERE id = ?", (article_id,))]
+                self._dirty_prefixes.update(t[:self.TERM_PREFIX] for t in old_terms)
+                self._db.execute("DELETE FROM search_terms WHERE id = ?", (article_id,))
+            else:
+                cursor = self._db.execute(
+                    "INSERT INTO listing_articles (slug, title, date) VALUES (?, ?, ?)", (slug, title, date)
+                )
+                article_id = cursor.lastrowid
+
+            for kind, key, label in memberships:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO listing_members (kind, key, label, id) VALUES (?, ?, ?, ?)",
+                    (kind, key, label, article_id)
+                )
+                page = self._page_of(kind, key, article_id)
+                self._dirty_pages.add((kind, key, page))
+                if page > 1 and self._count(kind, key) == (page - 1) * self.page_size + 1:
+                    # A new page was started, the previous one needs a "next" link
+                    self._dirty_pages.add((kind, key, page - 1))
+                self._dirty_kinds.add(kind)
+
+            self._db.executemany(
+                "INSERT OR IGNORE INTO search_terms (term, id) VALUES (?, ?)", ((t, article_id) for t in terms)
+            )
+            self._db.commit()
+            self._dirty_prefixes.update(t[:self.TERM_PREFIX] for t in terms)
+            self._dirty_docs.add(article_id // self.DOC_SHARD_SIZE)
+
+    def flush(self) -> int:
+        """Write every page and shard touched since the last flush, returning the number of files written."""
+        with self._lock:
+            pages, self._dirty_pages = self._dirty_pages, set()
+            kinds, self._dirty_kinds = self._dirty_kinds, set()
+            prefixes, self._dirty_prefixes = self._dirty_prefixes, set()
+            docs, self._dirty_docs = self._dirty_docs, set()
+        if not (pages or kinds or prefixes or docs):
+            return 0
+
+        written = 0
+        for kind, key, page in sorted(pages):
+            written += self._write_listing_page(kind, key, page)
+        for kind in sorted(kinds):
+            written += self._write_directory(kind)
+        if kinds:
+            written += self._write_root()
+        for prefix in sorted(prefixes):
+            written += self._write_term_shard(prefix)
+        for shard in sorted(docs):
+            written += self._write_doc_shard(shard)
+        if prefixes or docs:
+            written += self.writer.write(
+                Path.joinpath(self.output_directory, "search", "meta.json"),
+                json.dumps({"term_prefix": self.TERM_PREFIX, "doc_shard_size": self.DOC_SHARD_SIZE})
+            )
+        logging.info(f"Updated site index: {written} files rewritten")
+        return written
+
+    def invalidate(self):
+        """Mark every listing page and shard dirty, for full rebuilds."""
+        with self._lock:
+            for kind, key, count in self._db.execute(
+                "SELECT kind, key, COUNT(*) FROM listing_members GROUP BY kind, key"
+            ).fetchall():
+                self._dirty_pages.update((kind, key, p) for p in range(1, self._pages(count) + 1))
+                self._dirty_kinds.add(kind)
+            self._dirty_prefixes.update(
+                t for (t,) in self._db.execute(
+                    f"SELECT DISTINCT substr(term, 1, {self.TERM_PREFIX}) FROM search_terms"
+                )
+            )
+            max_id = self._db.execute("SELECT MAX(id) FROM listing_articles").fetchone()[0] or 0
+            self._dirty_docs.update(range(max_id // self.DOC_SHARD_SIZE + 1))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _memberships(self, data: dict) -> list[tuple[str, str, str]]:
+        date = data.get("date") or ""
+        month = date[:7] if re.match(r"\d{4}-\d{2}", date) else "undated"
+        memberships = [("date", month, month)]
+        for author in dict.fromkeys(data.get("author") or []):
+            if author and author.strip():
+                memberships.append(("author", _key(author), author.strip()))
+        source = urlparse(data.get("source") or data.get("url") or "").netloc or "unknown"
+        memberships.append(("source", _key(source), source))
+        return memberships
+
+    def _count(self, kind, key) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM listing_members WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()[0]
+
+    def _page_of(self, kind, key, article_id) -> int:
+        position = self._db.execute(
+            "SELECT COUNT(*) FROM listing_members WHERE kind = ? AND key = ? AND id < ?", (kind, key, article_id)
+        ).fetchone()[0]
+        return position // self.page_size + 1
+
+    def _pages(self, count) -> int:
+        return max(1, -(-count // self.page_size))
+
+    def _write_listing_page(self, kind, key, page) -> int:
+        with self._lock:
+            count = self._count(kind, key)
+            rows = self._db.execute(
+                """
+                SELECT a.slug, a.title, a.date, m.label FROM listing_members m
+                JOIN listing_articles a ON a.id = m.id
+                WHERE m.kind = ? AND m.key = ?
+                ORDER BY m.id LIMIT ? OFFSET ?
+                """,
+                (kind, key, self.page_size, (page - 1) * self.page_size)
+            ).fetchall()
+        path = Path.joinpath(self.output_directory, "index", kind, key, f"{page}.html")
+        if not rows:
+            # The listing shrank; drop pages that are now past the end
+            self.writer.remove(path)
+            return 0
+
+        pages = self._pages(count)
+        root = "../../../"
+        html = self.render("listing.html", {
+            "title": f"{KINDS[kind]}: {rows[0][3]}",
+            "root": root,
+            "heading": rows[0][3],
+            "articles": [
+                {"title": title, "href": f"{root}html/{slug}.html", "date": date}
+                for slug, title, date, _ in sorted(rows, key=lambda r: r[2], reverse=True)
+            ],
+            "page": page,
+            # Only the last page is rewritten as the listing grows, so only it shows the total
+            "pages": pages if page == pages else None,
+            "previous": f"{page - 1}.html" if page > 1 else None,
+            "next": f"{page + 1}.html" if page < pages else None,
+            "up": "../index.html",
+        })
+        return self.writer.write(path, html)
+
+    def _write_directory(self, kind) -> int:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, MIN(label), COUNT(*) FROM listing_members WHERE kind = ? GROUP BY key",
+                (kind,)
+            ).fetchall()
+        reverse = kind == "date"
+        rows.sort(key=lambda r: r[0] if reverse else r[1].lower(), reverse=reverse)
+        html = self.render("directory.html", {
+            "title": KINDS[kind],
+            "root": "../../",
+            "listings": [
+                {"label": label, "href": f"{key}/{self._pages(count)}.html", "count": count}
+                for key, label, count in rows
+            ],
+        })
+        return self.writer.write(Path.joinpath(self.output_directory, "index", kind, "index.html"), html)
+
+    def _write_root(self) -> int:
+        with self._lock:
+            total = self._db.execute("SELECT COUNT(*) FROM listing_articles").fetchone()[0]
+            latest = self._db.execute(
+                "SELECT slug, title, date FROM listing_articles ORDER BY id DESC LIMIT ?", (self.page_size,)
+            ).fetchall()
+        html = self.render("directory.html", {
+            "title": "Archive",
+            "root": "",
+            "count": total,
+            "listings": [{"label": label, "href": f"index/{kind}/index.html"} for kind, label in KINDS.items()],
+            "articles": [{"title": title, "href": f"html/{slug}.html", "date": date} for slug, title, date in latest],
+        })
+        return self.writer.write(Path.joinpath(self.output_directory, "index.html"), html)
+
+    def _write_term_shard(self, prefix) -> int:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT term, id FROM search_terms WHERE term >= ? AND term < ? ORDER BY term, id",
+                (prefix, prefix + "\uffff")
+            ).fetchall()
+        path = Path.joinpath(self.output_directory, "search", "terms", f"{prefix}.json")
+        if not rows:
+            self.writer.remove(path)
+            return 0
+        shard = {}
+        for term, article_id in rows:
+            shard.setdefault(term, []).append(article_id)
+        return self.writer.write(path, json.dumps(shard, separators=(",", ":")))
+
+    def _write_doc_shard(self, shard) -> int:
+        low = shard * self.DOC_SHARD_SIZE
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, slug, title, date FROM listing_articles WHERE id >= ? AND id < ? ORDER BY id",
+                (low, low + self.DOC_SHARD_SIZE)
+            ).fetchall()
+        docs = {article_id: [title, f"html/{slug}.html", date] for article_id, slug, title, date in rows}
+        path = Path.joinpath(self.output_directory, "search", "docs", f"{shard}.json")
+        return self.writer.write(path, json.dumps(docs, separators=(",", ":")))
+
+
+def _key(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "unknown"
+
+
+def _terms(text: str) -> set[str]:
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    return {t for t in re.findall(r"[a-z0-9]+", text) if len(t) >= 2 and t not in STOPWORDS}
@@ -0,0 +1,318 @@
+# Module imports
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import zlib
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+# Brotli-encoded WARC payloads are skipped without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Larger records are skipped unread, they are never article pages
+MAX_PAGE_BYTES = 20 * 2**20
+# Bytes of a saved page searched for the URL it was saved from
+URL_SCAN_BYTES = 64 * 1024
+
+
+class UrlSource():
+    """Lazily read article URLs from a .txt, .csv, .jsonl or sitemap .xml file.
+
+    Any of these may be gzip-compressed (.gz). Progress is measured against
+    the size of the file on disk, so it works without counting entries first.
+    """
+
+    FORMATS = [".txt", ".csv", ".jsonl", ".xml"]
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        suffixes = [s.lower() for s in self.path.suffixes]
+        self.compressed = bool(suffixes) and suffixes[-1] == ".gz"
+        self.format = (suffixes[-2] if self.compressed and len(suffixes) > 1 else self.path.suffix.lower())
+
+        if self.format not in self.FORMATS:
+            logging.error(f"File format \"{''.join(self.path.suffixes)}\" is not supported")
+            raise ValueError(f"Unsupported input format: {self.path.name}")
+
+        st = self.path.stat()
+        self.size = st.st_size
+        # Identifies this exact input for checkpointing; changes if the file does
+        self.key = f"{self.path.resolve()}:{st.st_size}:{st.st_mtime_ns}"
+        self._raw = None
+
+    def __iter__(self):
+        readers = {
+            ".txt": self._read_txt,
+            ".csv": self._read_csv,
+            ".jsonl": self._read_jsonl,
+            ".xml": self._read_sitemap,
+        }
+        with open(self.path, "rb") as raw:
+            self._raw = raw
+            stream = gzip.open(raw) if self.compressed else raw
+            try:
+                for url in readers[self.format](stream):
+                    url = url.strip()
+                    if url:
+                        yield url
+            finally:
+                self._raw = None
+
+    def progress(self) -> float:
+        """Fraction of the input file consumed so far."""
+        if self._raw is None or not self.size:
+            return 1.0
+        try:
+            return min(1.0, self._raw.tell() / self.size)
+        except (OSError, ValueError):
+            return 0.0
+
+    def _read_txt(self, stream):
+        for line in io.TextIOWrapper(stream, encoding="utf-8", errors="replace"):
+            if not line.lstrip().startswith("#"):
+                yield line
+
+    def _read_csv(self, stream):
+        reader = csv.reader(io.TextIOWrapper(stream, encoding="utf-8", errors="replace", newline=""))
+        column = 0
+        for idx, row in enumerate(reader):
+            if not row:
+                continue
+            if idx == 0 and "url" in [c.strip().lower() for c in row]:
+                column = [c.strip().lower() for c in row].index("url")
+                continue
+            if len(row) > column:
+                yield row[column]
+
+    def _read_jsonl(self, stream):
+        for lineno, line in enumerate(io.TextIOWrapper(stream, encoding="utf-8", errors="replace"), 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logging.warning(f"Skipping invalid JSON on line {lineno} of {self.path.name}: {e}")
+                continue
+            url = record.get("url") if isinstance(record, dict) else record
+            if isinstance(url, str):
+                yield url
+
+    def _read_sitemap(self, stream):
+        for event, element in ET.iterparse(stream, events=("start", "end")):
+            tag = element.tag.rsplit("}", 1)[-1]
+            if event == "start":
+                if tag == "sitemapindex":
+                    logging.error(f"{self.path.name} is a sitemap index; pass the article sitemaps it lists instead")
+                    return
+                continue
+            if tag == "loc" and element.text:
+                yield element.text
+            elif tag == "url":
+                # Keep memory flat on large sitemaps
+                element.clear()
+
+
+class PageSource():
+    """Lazily read (url, html) pages from a WARC file or a directory of saved HTML.
+
+    WARC files may be gzip-compressed (.warc.gz), per record or as a whole.
+    Only successful HTML responses and HTML resource records are yielded,
+    one record in memory at a time. Saved pages are found recursively; their
+    URL is the one the saving tool noted, else their canonical link, else
+    the file's own URI.
+    """
+
+    HTML_SUFFIXES = {".html", ".htm", ".xhtml"}
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        suffixes = [s.lower() for s in self.path.suffixes]
+        self.compressed = bool(suffixes) and suffixes[-1] == ".gz"
+        if self.path.is_dir():
+            self.format = "directory"
+        elif (suffixes[-2:-1] if self.compressed else suffixes[-1:]) == [".warc"]:
+            self.format = "warc"
+        else:
+            logging.error(f"{self.path.name} is neither a .warc(.gz) file nor a directory")
+            raise ValueError(f"Unsupported ingest source: {self.path.name}")
+
+        self.size = self.path.stat().st_size if self.format == "warc" else 0
+        self._raw = None
+
+    def __iter__(self):
+        if self.format == "directory":
+            yield from self._read_directory()
+            return
+        with open(self.path, "rb") as raw:
+            self._raw = raw
+            stream = gzip.open(raw) if self.compressed else raw
+            try:
+                yield from self._read_warc(stream)
+            finally:
+                self._raw = None
+
+    def progress(self) -> float | None:
+        """Fraction of a WARC file consumed so far, None for directories."""
+        if self.format == "directory":
+            return None
+        if self._raw is None or not self.size:
+            return 1.0
+        try:
+            return min(1.0, self._raw.tell() / self.size)
+        except (OSError, ValueError):
+            return 0.0
+
+    def _read_warc(self, stream):
+        while line := stream.readline():
+            if not line.strip():
+                continue
+            if not line.startswith(b"WARC/"):
+                logging.error(f"Lost the record boundary in {self.path.name}, stopping")
+                return
+            headers = _read_headers(stream)
+            try:
+                length = int(headers.get("content-length", 0))
+            except ValueError:
+                logging.error(f"Invalid Content-Length in {self.path.name}, stopping")
+                return
+            record_type = headers.get("warc-type", "")
+            content_type = headers.get("content-type", "").lower()
+            url = headers.get("warc-target-uri", "").strip("<> ")
+
+            html = None
+            if not url or length > MAX_PAGE_BYTES:
+                _skip(stream, length)
+            elif record_type == "response" and content_type.startswith("application/http"):
+                html = _http_html(stream.read(length))
+            elif record_type == "resource" and "html" in content_type:
+                html = _decode(stream.read(length), content_type)
+            else:
+                _skip(stream, length)
+            if html:
+                yield url, html
+
+    def _read_directory(self):
+        # Walked directory by directory, so huge trees are never listed whole
+        for root, dirs, files in os.walk(self.path):
+            dirs.sort()
+            for name in sorted(files):
+                path = Path(root, name)
+                if path.suffix.lower() not in self.HTML_SUFFIXES:
+                    continue
+                try:
+                    raw = path.read_bytes()
+                except OSError as e:
+                    logging.warning(f"Could not read {path}: {e}")
+                    continue
+                if len(raw) > MAX_PAGE_BYTES:
+                    logging.warning(f"Skipping {path}, larger than {MAX_PAGE_BYTES // 2**20} MiB")
+                    continue
+                html = _decode(raw, _meta_charset(raw))
+                yield _saved_url(html) or path.resolve().as_uri(), html
+
+
+def _read_headers(stream) -> dict[str, str]:
+    headers = {}
+    while line := stream.readline():
+        line = line.decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def _skip(stream, length: int):
+    while length > 0:
+        chunk = stream.read(min(length, 2**20))
+        if not chunk:
+            return
+        length -= len(chunk)
+
+
+def _http_html(block: bytes) -> str | None:
+    """Body of a recorded HTTP response, if it is a successful HTML page."""
+    head, sep, body = block.partition(b"\r\n\r\n")
+    if not sep:
+        head, sep, body = block.partition(b"\n\n")
+    lines = head.decode("latin-1").splitlines()
+    status = lines[0].split() if lines else []
+    if len(status) < 2 or status[1] != "200":
+        return None
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+
+    content_type = headers.get("content-type", "text/html")
+    if "html" not in content_type:
+        return None
+    try:
+        if "chunked" in headers.get("transfer-encoding", ""):
+            body = _dechunk(body)
+        encoding = headers.get("content-encoding", "")
+        if encoding in ("gzip", "x-gzip"):
+            body = gzip.decompress(body)
+        elif encoding == "deflate":
+            body = zlib.decompress(body, -zlib.MAX_WBITS) if body[:1] != b"\x78" else zlib.decompress(body)
+        elif encoding == "br" and brotli is not None:
+            body = brotli.decompress(body)
+        elif encoding not in ("", "identity"):
+            return None
+    except Exception as e:
+        logging.debug(f"Undecodable response body: {type(e).__name__}: {e}")
+        return None
+    return _decode(body, content_type if "charset" in content_type else _meta_charset(body))
+
+
+def _dechunk(body: bytes) -> bytes:
+    chunks, pos = [], 0
+    while pos < len(body):
+        end = body.find(b"\r\n", pos)
+        if end < 0:
+            break
+        size = int(body[pos:end].split(b";")[0] or b"0", 16)
+        if size == 0:
+            break
+        chunks.append(body[end + 2:end + 2 + size])
+        pos = end + 4 + size
+    return b"".join(chunks)
+
+
+def _meta_charset(raw: bytes) -> str:
+    match = re.search(rb"""<meta[^>]+charset=["']?([\w-]+)""", raw[:4096], re.IGNORECASE)
+    return f"charset={match.group(1).decode('ascii')}" if match else ""
+
+
+def _decode(raw: bytes, content_type: str) -> str:
+    match = re.search(r"charset=[\"']?([\w-]+)", content_type or "", re.IGNORECASE)
+    try:
+        return raw.decode(match.group(1) if match else "utf-8", errors="replace")
+    except LookupError:
+        return raw.decode("utf-8", errors="replace")
+
+
+# Notes saving tools leave in the page, then the page's own declarations
+SAVED_URL_PATTERNS = [
+    re.compile(r"<!--\s*saved from url=\(\d+\)(\S+?)\s*-->", re.IGNORECASE),
+    re.compile(r"<!--\s*Page saved with SingleFile\s+url:\s*(\S+)", re.IGNORECASE),
+    re.compile(r"<link\b[^>]*\brel=[\"']?canonical\b[^>]*\bhref=[\"']([^\"'>\s]+)", re.IGNORECASE),
+    re.compile(r"<link\b[^>]*\bhref=[\"']([^\"'>\s]+)[\"'][^>]*\brel=[\"']?canonical\b", re.IGNORECASE),
+    re.compile(r"<meta\b[^>]*\bproperty=[\"']og:url[\"'][^>]*\bcontent=[\"']([^\"'>\s]+)", re.IGNORECASE),
+]
+
+
+def _saved_url(html: str) -> str | None:
+    head = html[:URL_SCAN_BYTES]
+    for pattern in SAVED_URL_PATTERNS:
+        match = pattern.search(head)
+        if match and match.group(1).startswith(("http://", "https://")):
+            return match.group(1)
+    return None
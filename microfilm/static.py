@@ -0,0 +1,136 @@
+# Internal dependencies
+from writer import FileWriter
+
+# Module imports
+import hashlib
+import json
+import logging
+import re
+import threading
+import urllib.request
+from pathlib import Path, PurePosixPath
+from urllib.parse import urljoin, urlsplit
+
+# Template calls naming a shared asset, e.g. {{ asset("https://unpkg.com/...") }}
+ASSET_CALL = re.compile(r"""\basset\(\s*["']([^"']+)["']\s*\)""")
+# Fonts and images a stylesheet refers to
+CSS_URL = re.compile(r"""url\(\s*(["']?)([^"')]+)\1\s*\)""")
+FETCH_TIMEOUT = 30
+# Stylesheets importing stylesheets are followed this deep
+MAX_DEPTH = 2
+
+# Matched in order: conditional comments, comments, raw text elements, tags, whitespace runs
+_MINIFY = re.compile(
+    r"(?P<keep><!--\[if.*?-->)"
+    r"|(?P<comment>\s*<!--.*?-->)"
+    r"|(?P<raw><(?P<element>pre|textarea|script|style)\b.*?</(?P=element)\s*>)"
+    r"|(?P<tag><[^>]*>)"
+    r"|(?P<space>\s+)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+class AssetStore():
+    """Shared CSS and JS vendored into the site under content-fingerprinted names.
+
+    Each asset is fetched once by vendor(), written to the assets directory
+    as name.<hash>.ext and recorded in manifest.json, so pages keep working
+    offline and the files can be cached forever. Files a stylesheet refers
+    to are vendored next to it. An asset that isn't vendored keeps its
+    original URL.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, directory: Path, writer: FileWriter = None):
+        self.directory = Path(directory)
+        self.writer = writer or FileWriter()
+        self._lock = threading.Lock()
+        try:
+            self.manifest = json.loads(Path.joinpath(self.directory, self.MANIFEST).read_text())
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def vendor(self, urls) -> int:
+        """Fetch every URL that is not vendored yet, returning how many were added."""
+        added = 0
+        with self._lock:
+            for url in urls:
+                if url in self.manifest:
+                    continue
+                try:
+                    self.manifest[url] = self._fetch(url)
+                    added += 1
+                    logging.info(f"Vendored {url} as {self.manifest[url]}")
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Could not vendor {url}, pages will link to it directly: {type(e).__name__}: {e}")
+            if added:
+                self.writer.write(
+                    Path.joinpath(self.directory, self.MANIFEST), json.dumps(self.manifest, indent=4, sort_keys=True)
+                )
+        return added
+
+    def href(self, url: str, root: str = "") -> str:
+        """Link to the vendored copy of `url` from a page `root` below the site root."""
+        name = self.manifest.get(url)
+        return f"{root}{self.directory.name}/{name}" if name else url
+
+    def _fetch(self, url: str, depth: int = 0) -> str:
+        with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as response:
+            content = response.read()
+            final = response.geturl()
+            content_type = response.headers.get_content_type()
+        if content_type == "text/css" or final.endswith(".css"):
+            content = self._vendor_css(content, final, depth)
+        name = _fingerprint(final, content)
+        self.writer.write(Path.joinpath(self.directory, name), content)
+        return name
+
+    def _vendor_css(self, content: bytes, base: str, depth: int) -> bytes:
+        """Vendor what a stylesheet refers to and point it at the copies, which sit beside it."""
+        if depth >= MAX_DEPTH:
+            return content
+
+        def replace(match):
+            ref = match.group(2).strip()
+            if ref.startswith(("data:", "#")):
+                return match.group(0)
+            try:
+                return f'url("{self._fetch(urljoin(base, ref), depth + 1)}")'
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not vendor {ref} from {base}: {type(e).__name__}: {e}")
+                return f'url("{urljoin(base, ref)}")'
+
+        return CSS_URL.sub(replace, content.decode("utf-8")).encode("utf-8")
+
+
+def template_assets(template_directory: Path) -> list[str]:
+    """URLs passed to asset() anywhere in the templates, in a stable order."""
+    urls = set()
+    for path in sorted(Path(template_directory).rglob("*")):
+        if path.is_file():
+            urls.update(ASSET_CALL.findall(path.read_text(encoding="utf-8", errors="replace")))
+    return sorted(urls)
+
+
+def minify_html(html: str) -> str:
+    """Drop comments and collapse whitespace, leaving tags, pre, textarea, script and style untouched.
+
+    Runs of whitespace become one space rather than nothing, which renders
+    the same while keeping the spaces between inline elements.
+    """
+    def replace(match):
+        if match.lastgroup == "comment":
+            return ""
+        if match.lastgroup == "space":
+            return " "
+        return match.group(0)
+
+    return _MINIFY.sub(replace, html).strip()
+
+
+def _fingerprint(url: str, content: bytes) -> str:
+    name = PurePosixPath(urlsplit(url).path).name or "asset"
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, dot, suffix = name.rpartition(".")
+    return f"{stem}.{digest}.{suffix}" if dot and stem else f"{name}.{digest}"
@@ -0,0 +1,39 @@
+# Module imports
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+class HostLimiter():
+    """Per-host concurrency and request-rate limits shared between threads.
+
+    `concurrency` caps simultaneous requests to one host; `rate` caps request
+    starts per second to one host (0 disables the rate limit).
+    """
+
+    def __init__(self, concurrency: int = 2, rate: float = 0):
+        self.concurrency = max(1, concurrency)
+        self.interval = 1 / rate if rate and rate > 0 else 0
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_start = {}
+
+    @contextmanager
+    def slot(self, url: str):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            semaphore = self._slots.setdefault(host, threading.BoundedSemaphore(self.concurrency))
+        with semaphore:
+            self._wait_turn(host)
+            yield
+
+    def _wait_turn(self, host: str):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
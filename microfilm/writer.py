@@ -0,0 +1,122 @@
+# Module imports
+import gzip
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+# .br siblings are not written without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Precompressed sibling suffix and compressor per encoding. Files are written
+# once and served many times, so both use their strongest setting short of
+# brotli's very slow quality 11.
+ENCODINGS = {
+    "gzip": (".gz", lambda content: gzip.compress(content, compresslevel=9, mtime=0)),
+    "br": (".br", lambda content: brotli.compress(content, quality=10)),
+}
+# Only text formats are worth compressing
+COMPRESSIBLE = {".html", ".json", ".css", ".js", ".svg", ".xml", ".txt"}
+
+
+class FileWriter():
+    """Atomic writer that leaves files alone when their content is unchanged.
+
+    Files are written to a temporary sibling and renamed into place, so a
+    crash never leaves a truncated file. Skipping identical content keeps
+    mtimes stable for rsync and CDN sync jobs.
+
+    With `precompress` set, text files also get .gz and/or .br siblings for
+    nginx gzip_static and brotli_static. They are only compressed when the
+    file changes or a sibling is missing, and are written before the file
+    itself, so a sibling is never older than the file it belongs to. When
+    a file changes, siblings of encodings that are no longer enabled are
+    removed.
+    """
+
+    def __init__(self, durable: bool = False, precompress: list[str] = ()):
+        self.durable = durable
+        self.precompress = []
+        for encoding in precompress or ():
+            if encoding == "br" and brotli is None:
+                logging.warning("brotli is not installed, .br siblings will not be written")
+            elif encoding in ENCODINGS:
+                self.precompress.append(encoding)
+            else:
+                logging.warning(f"Ignoring unknown precompress encoding '{encoding}', expected one of {list(ENCODINGS)}")
+        self._directories = set()
+        self._lock = threading.Lock()
+
+    def write(self, path: Path, content: str | bytes) -> bool:
+        """Write content to path, returning False if the file already matched."""
+        path = Path(path)
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+
+        if self._matches(path, content):
+            self._write_siblings(path, content, missing_only=True)
+            return False
+
+        self._ensure_directory(path.parent)
+        self._write_siblings(path, content)
+        self._replace(path, content)
+        return True
+
+    def write_many(self, files: dict) -> dict:
+        """Write several {path: content} files, returning {path: written}."""
+        return {path: self.write(path, content) for path, content in files.items()}
+
+    def remove(self, path: Path):
+        """Delete a file along with its precompressed siblings."""
+        path = Path(path)
+        path.unlink(missing_ok=True)
+        for suffix, _ in ENCODINGS.values():
+            path.with_name(path.name + suffix).unlink(missing_ok=True)
+
+    def _write_siblings(self, path: Path, content: bytes, missing_only: bool = False):
+        if path.suffix.lower() not in COMPRESSIBLE:
+            return
+        for encoding, (suffix, compress) in ENCODINGS.items():
+            sibling = path.with_name(path.name + suffix)
+            if encoding not in self.precompress:
+                # Left over from when the encoding was enabled, and would be served stale
+                if not missing_only:
+                    sibling.unlink(missing_ok=True)
+            elif not (missing_only and sibling.exists()):
+                self._replace(sibling, compress(content))
+
+    def _replace(self, path: Path, content: bytes):
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+                if self.durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def _matches(self, path: Path, content: bytes) -> bool:
+        try:
+            if path.stat().st_size != len(content):
+                return False
+            return path.read_bytes() == content
+        except FileNotFoundError:
+            return False
+
+    def _ensure_directory(self, directory: Path):
+        if directory in self._directories:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._directories.add(directory)